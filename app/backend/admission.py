@@ -0,0 +1,247 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+# Admission control in front of the API. Every request is put in a route
+# class with its own concurrency limit and bounded wait queue, and charged
+# to a per-user token bucket (JWT sub, or client address when anonymous).
+# A full queue, or overall queueing past ADMISSION_SHED_DEPTH for classes
+# marked sheddable, answers 503 with a Retry-After estimated from recent
+# service times, so heavy endpoints back off first and cheap ones keep
+# flowing. State is per worker process.
+#
+# Month reports (monthly-summary, daily for one month, range) are snapshot
+# reads and count as light: the range page asks for one summary per month
+# at once. Anonymous requests (login) are keyed by client address, which
+# behind a proxy is only the real client when uvicorn trusts its
+# X-Forwarded-For (`cli.py serve --forwarded-allow-ips`).
+# ADMISSION_ENABLED=0 leaves the middleware out, e.g. for bench_serve.py.
+
+def _env(name, default, cast=int):
+    return cast(os.getenv(name, default))
+
+
+# name: (pattern on path?query, concurrency, queue, rate/s, burst, sheddable)
+ROUTE_CLASSES = {
+    "auth": (
+        r"^/api/auth/login$",
+        _env("ADMISSION_AUTH_CONCURRENCY", "4"), _env("ADMISSION_AUTH_QUEUE", "16"),
+        _env("ADMISSION_AUTH_RATE", "0.2", float), _env("ADMISSION_AUTH_BURST", "5"),
+        False,
+    ),
+    "heavy": (
+        r"^/api/(exports$|exports/[^/]+/download|import/(?!jobs/)"
+        r"|revenue/export|expenses/export|export/"
+        r"|reports/(daily(?!\?(.*&)?month=[^&])|balance)"
+        r"|expenses/[^/]+/attachments/[^/]+/thumbnail)",
+        _env("ADMISSION_HEAVY_CONCURRENCY", "4"), _env("ADMISSION_HEAVY_QUEUE", "8"),
+        _env("ADMISSION_HEAVY_RATE", "0.5", float), _env("ADMISSION_HEAVY_BURST", "10"),
+        True,
+    ),
+    "light": (
+        r"^/api/",
+        _env("ADMISSION_LIGHT_CONCURRENCY", "64"), _env("ADMISSION_LIGHT_QUEUE", "256"),
+        _env("ADMISSION_LIGHT_RATE", "20", float), _env("ADMISSION_LIGHT_BURST", "150"),
+        False,
+    ),
+}
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_QUEUE_TIMEOUT = _env("ADMISSION_QUEUE_TIMEOUT", "10", float)
+ADMISSION_SHED_DEPTH = _env("ADMISSION_SHED_DEPTH", "32")
+ADMISSION_MAX_BUCKETS = _env("ADMISSION_MAX_BUCKETS", "10000")
+
+
+class Rejected(Exception):
+
+    def __init__(self, status, detail, retry_after):
+        self.status = status
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RouteClass:
+
+    def __init__(self, name, pattern, concurrency, queue, rate, burst, sheddable):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.concurrency = concurrency
+        self.queue = queue
+        self.rate = rate
+        self.burst = burst
+        self.sheddable = sheddable
+        self.sem = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 0.1   # EWMA seconds
+        self.admitted = 0
+        self.shed = 0
+        self.limited = 0
+
+    def retry_after(self):
+        """Time for the current queue to drain at recent service times."""
+
+        return (self.waiting + 1) * self.service_time / self.concurrency
+
+    def observe(self, seconds):
+        self.service_time += 0.2 * (seconds - self.service_time)
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "service_ms": round(self.service_time * 1000, 1),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "rate_limited": self.limited,
+        }
+
+
+class TokenBuckets:
+    """Per-key token buckets, oldest keys dropped beyond max_keys."""
+
+    def __init__(self, max_keys=ADMISSION_MAX_BUCKETS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    def take(self, key, rate, burst, now=None):
+        """Spend one token; return 0 or the seconds until one is available."""
+
+        now = time.monotonic() if now is None else now
+        tokens, last = self.buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+class Admission:
+
+    def __init__(self, secret, algorithm, classes=ROUTE_CLASSES, lookup=None):
+        self.secret = secret
+        self.algorithm = algorithm
+        # token -> already verified user, to skip a second decode
+        self.lookup = lookup
+        self.classes = [RouteClass(name, *cfg) for name, cfg in classes.items()]
+        self.buckets = TokenBuckets()
+
+    def classify(self, path, query=b""):
+        target = f"{path}?{query.decode('latin-1')}" if query else path
+        for rc in self.classes:
+            if rc.pattern.match(target):
+                return rc
+        return None
+
+    def client_key(self, scope):
+        for name, value in scope.get("headers") or []:
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                user = self.lookup and self.lookup(value[7:].decode("latin-1"))
+                if user is not None:
+                    return "user:" + user.id
+                try:
+                    payload = jwt.decode(
+                        value[7:].decode(), self.secret, algorithms=[self.algorithm]
+                    )
+                    return "user:" + str(payload["sub"])
+                except (jwt.PyJWTError, KeyError, UnicodeDecodeError):
+                    break
+        client = scope.get("client")
+        return "addr:" + (client[0] if client else "unknown")
+
+    def waiting(self):
+        return sum(rc.waiting for rc in self.classes)
+
+    async def admit(self, rc, key):
+        wait = self.buckets.take((rc.name, key), rc.rate, rc.burst)
+        if wait:
+            rc.limited += 1
+            raise Rejected(429, "Too many requests", wait)
+
+        if rc.active >= rc.concurrency:
+            if rc.waiting >= rc.queue or (
+                    rc.sheddable and self.waiting() >= ADMISSION_SHED_DEPTH):
+                rc.shed += 1
+                raise Rejected(503, "Server busy, retry later", rc.retry_after())
+
+        rc.waiting += 1
+        try:
+            await asyncio.wait_for(rc.sem.acquire(), ADMISSION_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            rc.shed += 1
+            raise Rejected(503, "Server busy, retry later", rc.retry_after())
+        finally:
+            rc.waiting -= 1
+
+        rc.active += 1
+        rc.admitted += 1
+
+    def release(self, rc, started):
+        rc.active -= 1
+        rc.observe(time.monotonic() - started)
+        rc.sem.release()
+
+    def stats(self):
+        return {
+            "waiting": self.waiting(),
+            "shed_depth": ADMISSION_SHED_DEPTH,
+            "buckets": len(self.buckets.buckets),
+            "classes": {rc.name: rc.stats() for rc in self.classes},
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware, so streamed responses hold their slot until
+    the last chunk is sent."""
+
+    def __init__(self, app, admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        rc = self.admission.classify(scope["path"], scope.get("query_string"))
+        if rc is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await self.admission.admit(rc, self.admission.client_key(scope))
+        except Rejected as e:
+            return await self.reject(e, send)
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(rc, started)
+
+    @staticmethod
+    async def reject(e, send):
+        body = json.dumps({"detail": e.detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": e.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(e.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,194 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+
+# Receipt attachments for expenses. Files live in the GridFS "attachments"
+# bucket and are copied in and out one chunk at a time; only a small
+# metadata entry is kept on the expense itself. Thumbnails are rendered in
+# a process pool on first request and cached in the "thumbnails" bucket.
+
+ATTACHMENT_MAX_MB = int(os.getenv("ATTACHMENT_MAX_MB", "15"))
+ATTACHMENT_CHUNK_KB = int(os.getenv("ATTACHMENT_CHUNK_KB", "255"))
+ATTACHMENTS_PER_EXPENSE = int(os.getenv("ATTACHMENTS_PER_EXPENSE", "10"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "1"))
+THUMBNAIL_SIZES = (128, 256, 512)
+
+CONTENT_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "image/gif",
+    "application/pdf",
+}
+
+
+class TooLarge(Exception):
+    pass
+
+
+def content_disposition(filename, disposition="inline"):
+    """Header value for a client-supplied filename: an ASCII fallback plus
+    the UTF-8 name per RFC 5987 (headers are sent as latin-1)."""
+
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename or "") or "attachment"
+    return (
+        f'{disposition}; filename="{fallback}"; '
+        f"filename*=UTF-8''{quote(filename or fallback, safe='')}"
+    )
+
+
+def render_thumbnail(content, size):
+    """Runs in the pool: JPEG thumbnail fitting in size x size."""
+
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(content)) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((size, size))
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        im.save(out, "JPEG", quality=80, optimize=True)
+        return out.getvalue()
+
+
+class Attachments:
+
+    def __init__(self, db=None, workers=THUMBNAIL_WORKERS):
+        self.db = db
+        self.workers = workers
+        self._pool = None
+        self._rendering = {}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn, not fork: the parent holds Motor's threads and sockets
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    @property
+    def files(self):
+        return AsyncIOMotorGridFSBucket(
+            self.db, bucket_name="attachments",
+            chunk_size_bytes=ATTACHMENT_CHUNK_KB * 1024,
+        )
+
+    @property
+    def thumbs(self):
+        return AsyncIOMotorGridFSBucket(self.db, bucket_name="thumbnails")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def ensure_indexes(self):
+        await self.db["thumbnails.files"].create_index(
+            [("metadata.attachment_id", 1), ("metadata.size", 1)]
+        )
+
+    async def save(self, upload, expense_id, user_id=None):
+        """Copy an upload into GridFS chunk by chunk; return its metadata."""
+
+        limit = ATTACHMENT_MAX_MB * 1024 * 1024
+        meta = {
+            "id": str(uuid.uuid4()),
+            "filename": upload.filename or "receipt",
+            "content_type": upload.content_type,
+        }
+
+        stream = self.files.open_upload_stream(
+            meta["filename"],
+            metadata={
+                "expense_id": expense_id,
+                "attachment_id": meta["id"],
+                "content_type": meta["content_type"],
+            },
+        )
+        size = 0
+        try:
+            while chunk := await upload.read(ATTACHMENT_CHUNK_KB * 1024):
+                size += len(chunk)
+                if size > limit:
+                    raise TooLarge(f"attachments are limited to {ATTACHMENT_MAX_MB} MB")
+                await stream.write(chunk)
+        except BaseException:
+            await stream.abort()
+            raise
+        await stream.close()
+
+        return {
+            **meta,
+            "file_id": str(stream._id),
+            "size": size,
+            "uploaded_by": user_id,
+            "uploaded_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def open(self, meta):
+        return await self.files.open_download_stream(ObjectId(meta["file_id"]))
+
+    async def delete(self, meta):
+        try:
+            await self.files.delete(ObjectId(meta["file_id"]))
+        except NoFile:
+            pass
+
+        cursor = self.db["thumbnails.files"].find(
+            {"metadata.attachment_id": meta["id"]}, {"_id": 1}
+        )
+        async for t in cursor:
+            await self.thumbs.delete(t["_id"])
+
+    async def delete_all(self, metas):
+        for meta in metas or []:
+            await self.delete(meta)
+
+    async def thumbnail(self, meta, size):
+        """Return a cached thumbnail's GridOut, rendering it on a miss."""
+
+        cached = await self.db["thumbnails.files"].find_one(
+            {"metadata.attachment_id": meta["id"], "metadata.size": size}
+        )
+        if cached:
+            return await self.thumbs.open_download_stream(cached["_id"])
+
+        # concurrent misses for one thumbnail share a single render
+        key = (meta["id"], size)
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(meta, size))
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        file_id = await asyncio.shield(task)
+
+        return await self.thumbs.open_download_stream(file_id)
+
+    async def _render(self, meta, size):
+        # originals are capped at ATTACHMENT_MAX_MB and the decoder needs
+        # the whole image anyway
+        grid_out = await self.open(meta)
+        content = await grid_out.read()
+
+        loop = asyncio.get_running_loop()
+        thumb = await loop.run_in_executor(self.pool, render_thumbnail, content, size)
+
+        return await self.thumbs.upload_from_stream(
+            f"{meta['id']}_{size}.jpg", thumb,
+            metadata={"attachment_id": meta["id"], "size": size},
+        )
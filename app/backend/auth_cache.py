@@ -0,0 +1,153 @@
+import os
+import time
+from collections import OrderedDict
+
+from pymongo import ASCENDING
+
+
+# Authentication fast path. Users live in the users collection, indexed by
+# id and username, and are kept in a per-worker dict by id (re-read after
+# TOKEN_CACHE_TTL seconds, so a changed or deleted user is picked up). A
+# verified token maps straight to its user in a bounded LRU until the
+# token's exp (re-verified at least every TOKEN_CACHE_TTL seconds, so a
+# revocation made by another worker takes effect within that bound).
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+
+
+class TokenCache:
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()    # token -> (user, jti, valid_until)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token, now=None):
+        entry = self.entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if (time.time() if now is None else now) >= entry[2]:
+            del self.entries[token]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(token)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, token):
+        """Cached user without touching LRU order or stats (admission)."""
+
+        entry = self.entries.get(token)
+        if entry is not None and time.time() < entry[2]:
+            return entry[0]
+        return None
+
+    def put(self, token, user, jti, exp, now=None):
+        now = time.time() if now is None else now
+        self.entries[token] = (user, jti, min(exp, now + self.ttl))
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def revoke(self, jti=None, user_id=None):
+        """Drop cached tokens by jti, or every token of a user."""
+
+        for token, (user, token_jti, _) in list(self.entries.items()):
+            if (jti and token_jti == jti) or (user_id and user.id == user_id):
+                del self.entries[token]
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class UserDirectory:
+    """Users by id, loaded from Mongo and kept per worker for `ttl` seconds."""
+
+    def __init__(self, db=None, ttl=TOKEN_CACHE_TTL):
+        self.db = db
+        self.ttl = ttl
+        self.by_id = {}
+        self.loaded_at = {}
+
+    async def ensure_indexes(self):
+        await self.db.users.create_index([("id", ASCENDING)], unique=True)
+        await self.db.users.create_index([("username", ASCENDING)], unique=True)
+
+    async def seed(self, users, hash_password):
+        """Insert users that do not exist yet; existing ones are untouched.
+        An upsert, so workers starting together on a fresh DB don't race;
+        passwords are hashed only for ids not found, so a normal start does
+        no hashing."""
+
+        existing = {
+            d["id"] for d in await self.db.users.find(
+                {"id": {"$in": [u["id"] for u in users]}}, {"_id": 0, "id": 1}
+            ).to_list(None)
+        }
+
+        for u in users:
+            if u["id"] in existing:
+                continue
+            await self.db.users.update_one(
+                {"id": u["id"]},
+                {"$setOnInsert": {
+                    **{k: v for k, v in u.items() if k != "password"},
+                    "password": hash_password(u["password"]),
+                }},
+                upsert=True,
+            )
+
+    def put(self, u, now=None):
+        self.by_id[u["id"]] = u
+        self.loaded_at[u["id"]] = time.monotonic() if now is None else now
+
+    async def load(self):
+        self.by_id, self.loaded_at = {}, {}
+        async for u in self.db.users.find({}, {"_id": 0, "password": 0}):
+            self.put(u)
+
+    async def get(self, uid):
+        u = self.by_id.get(uid)
+        loaded = self.loaded_at.get(uid)
+        if u is not None and loaded is not None and time.monotonic() - loaded < self.ttl:
+            return u
+
+        u = await self.db.users.find_one({"id": uid}, {"_id": 0, "password": 0})
+        if u is None:
+            self.by_id.pop(uid, None)
+            self.loaded_at.pop(uid, None)
+        else:
+            self.put(u)
+        return u
+
+    async def by_username(self, username):
+        # login needs the hash, which is never kept in memory
+        return await self.db.users.find_one({"username": username}, {"_id": 0})
+
+    async def recipients(self):
+        return await self.db.users.find(
+            {"send_report": True}, {"_id": 0, "password": 0}
+        ).to_list(None)
+
+
+async def ensure_revocation_index(db):
+    # revoked tokens only need remembering until they would expire anyway
+    await db.revoked_tokens.create_index("jti", unique=True)
+    await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def is_revoked(db, jti):
+    return jti is not None and await db.revoked_tokens.find_one(
+        {"jti": jti}, {"_id": 1}
+    ) is not None
@@ -0,0 +1,268 @@
+import os
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+
+# Running cash balance. Whole-month revenue/expense totals are kept as
+# counters in month_totals (bumped on every write), which makes the
+# opening balance at any date one small read plus a partial-month sum.
+# The daily series itself is gap-filled and accumulated inside Mongo with
+# $densify and $setWindowFields (MongoDB 5.1+) over the indexed date range.
+
+BALANCE_MAX_DAYS = int(os.getenv("BALANCE_MAX_DAYS", "1100"))
+
+SOURCES = (
+    ("revenue", "total_revenue", "revenue"),
+    ("revenue_archive", "total_revenue", "revenue"),
+    ("expenses", "amount", "expenses"),
+    ("expenses_archive", "amount", "expenses"),
+)
+
+
+def _amount(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def ensure_indexes(db):
+    await db.revenue.create_index("date")
+    await db.expenses.create_index("date")
+
+
+# ---------- month counters ----------
+
+def _deltas(kind, docs, sign):
+    field = "total_revenue" if kind == "revenue" else "amount"
+    out = {}
+    for d in docs:
+        if d and d.get("date"):
+            month = d["date"][:7]
+            out[month] = out.get(month, 0) + sign * _amount(d.get(field))
+    return out
+
+
+async def _inc(db, kind, deltas):
+    ops = [
+        UpdateOne({"_id": m}, {"$inc": {kind: v}}, upsert=True)
+        for m, v in deltas.items() if v
+    ]
+    if ops:
+        await db.month_totals.bulk_write(ops, ordered=False)
+
+
+async def apply(db, kind, before=None, after=None):
+    deltas = _deltas(kind, [before], -1)
+    for m, v in _deltas(kind, [after], 1).items():
+        deltas[m] = deltas.get(m, 0) + v
+    await _inc(db, kind, deltas)
+
+
+async def apply_many(db, kind, docs):
+    await _inc(db, kind, _deltas(kind, docs, 1))
+
+
+async def rebuild(db):
+    totals = {}
+
+    for coll, field, kind in SOURCES:
+        rows = await db[coll].aggregate([
+            {"$group": {
+                "_id": {"$substr": ["$date", 0, 7]},
+                "t": {"$sum": {"$toDouble": f"${field}"}},
+            }},
+        ]).to_list(None)
+        for r in rows:
+            month = totals.setdefault(r["_id"], {"revenue": 0, "expenses": 0})
+            month[kind] += r["t"]
+
+    await db.month_totals.delete_many({})
+    if totals:
+        await db.month_totals.insert_many([
+            {"_id": m, **t} for m, t in totals.items()
+        ])
+    return len(totals)
+
+
+# ---------- queries ----------
+
+def _union(lo, hi, inclusive_hi=True):
+    """Pipeline over all four ledgers for dates in [lo, hi] (or [lo, hi))."""
+
+    date_q = {"$gte": lo, "$lte" if inclusive_hi else "$lt": hi}
+
+    def stage(field, kind):
+        return [
+            {"$match": {"date": date_q}},
+            {"$project": {
+                "_id": 0,
+                "date": 1,
+                "revenue": {"$toDouble": f"${field}"} if kind == "revenue" else {"$literal": 0},
+                "expenses": {"$toDouble": f"${field}"} if kind == "expenses" else {"$literal": 0},
+            }},
+        ]
+
+    first, *rest = SOURCES
+    pipeline = stage(first[1], first[2])
+    for coll, field, kind in rest:
+        pipeline.append({"$unionWith": {"coll": coll, "pipeline": stage(field, kind)}})
+    return pipeline
+
+
+async def opening_balance(db, start):
+    """Revenue minus expenses for every date before `start` (YYYY-MM-DD)."""
+
+    month = start[:7]
+
+    # whole months before the start month come from the counters
+    rows = await db.month_totals.aggregate([
+        {"$match": {"_id": {"$lt": month}}},
+        {"$group": {
+            "_id": None,
+            "revenue": {"$sum": "$revenue"},
+            "expenses": {"$sum": "$expenses"},
+        }},
+    ]).to_list(1)
+    total = rows[0]["revenue"] - rows[0]["expenses"] if rows else 0.0
+
+    # plus the days of the start month before start
+    if start[8:10] != "01":
+        rows = await db.revenue.aggregate([
+            *_union(f"{month}-01", start, inclusive_hi=False),
+            {"$group": {
+                "_id": None,
+                "revenue": {"$sum": "$revenue"},
+                "expenses": {"$sum": "$expenses"},
+            }},
+        ]).to_list(1)
+        if rows:
+            total += rows[0]["revenue"] - rows[0]["expenses"]
+
+    return total
+
+
+def _add_extra(rows, opening, window, extra):
+    """Fold expense rows that are not stored (recurring) into a finished
+    series and recompute the running balance and moving averages."""
+
+    by_day = {}
+    for e in extra:
+        by_day[e["date"]] = by_day.get(e["date"], 0) + _amount(e.get("amount"))
+
+    balance = opening
+    for i, r in enumerate(rows):
+        r["expenses"] += by_day.get(r["date"], 0)
+        r["net"] = r["revenue"] - r["expenses"]
+        balance += r["net"]
+        r["balance"] = balance
+
+        span = rows[max(0, i - window + 1):i + 1]
+        for k in ("revenue", "expenses", "net"):
+            r[f"avg_{k}"] = sum(x[k] for x in span) / len(span)
+
+
+def parse_range(start, end):
+    """start..end (YYYY-MM-DD) as datetimes, checked against
+    BALANCE_MAX_DAYS. Raises ValueError."""
+
+    try:
+        lo = datetime.strptime(start, "%Y-%m-%d")
+        hi = datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("start and end must be YYYY-MM-DD")
+    if lo.strftime("%Y-%m-%d") != start or hi.strftime("%Y-%m-%d") != end:
+        raise ValueError("start and end must be YYYY-MM-DD")
+    if hi < lo:
+        raise ValueError("end must not be before start")
+    if (hi - lo).days + 1 > BALANCE_MAX_DAYS:
+        raise ValueError(f"range must not exceed {BALANCE_MAX_DAYS} days")
+    return lo, hi
+
+
+async def daily_balance(db, start, end, window=7, extra=()):
+    """Gap-filled daily revenue/expenses/net with running balance and
+    moving averages over `window` days, for start..end inclusive.
+    `extra` are expense rows kept outside the ledgers (recurring)."""
+
+    lo, hi = parse_range(start, end)
+
+    opening = await opening_balance(db, start)
+    opening -= sum(_amount(e.get("amount")) for e in extra if e["date"] < start)
+    extra = [e for e in extra if start <= e["date"] <= end]
+    moving = {"documents": [-(window - 1), "current"]}
+
+    rows = await db.revenue.aggregate([
+        *_union(start, end),
+        {"$group": {
+            "_id": "$date",
+            "revenue": {"$sum": "$revenue"},
+            "expenses": {"$sum": "$expenses"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "revenue": 1,
+            "expenses": 1,
+            "day": {"$dateFromString": {
+                "dateString": "$_id", "format": "%Y-%m-%d", "onError": None,
+            }},
+        }},
+        {"$match": {"day": {"$ne": None}}},
+        {"$densify": {
+            "field": "day",
+            "range": {"step": 1, "unit": "day", "bounds": [lo, hi + timedelta(days=1)]},
+        }},
+        {"$set": {
+            "revenue": {"$ifNull": ["$revenue", 0]},
+            "expenses": {"$ifNull": ["$expenses", 0]},
+        }},
+        {"$set": {"net": {"$subtract": ["$revenue", "$expenses"]}}},
+        {"$setWindowFields": {
+            "sortBy": {"day": 1},
+            "output": {
+                "running": {
+                    "$sum": "$net",
+                    "window": {"documents": ["unbounded", "current"]},
+                },
+                "avg_revenue": {"$avg": "$revenue", "window": moving},
+                "avg_expenses": {"$avg": "$expenses", "window": moving},
+                "avg_net": {"$avg": "$net", "window": moving},
+            },
+        }},
+        {"$project": {
+            "date": {"$dateToString": {"date": "$day", "format": "%Y-%m-%d"}},
+            "revenue": 1,
+            "expenses": 1,
+            "net": 1,
+            "balance": {"$add": [opening, "$running"]},
+            "avg_revenue": 1,
+            "avg_expenses": 1,
+            "avg_net": 1,
+        }},
+        {"$sort": {"date": 1}},
+    ]).to_list(None)
+
+    if not rows:
+        # $densify has nothing to fill from when the range has no entries
+        rows = [
+            {
+                "date": (lo + timedelta(days=i)).strftime("%Y-%m-%d"),
+                "revenue": 0.0, "expenses": 0.0, "net": 0.0,
+                "balance": opening,
+                "avg_revenue": 0.0, "avg_expenses": 0.0, "avg_net": 0.0,
+            }
+            for i in range((hi - lo).days + 1)
+        ]
+
+    if extra:
+        _add_extra(rows, opening, window, extra)
+
+    return {
+        "start": start,
+        "end": end,
+        "window": window,
+        "opening_balance": opening,
+        "closing_balance": rows[-1]["balance"] if rows else opening,
+        "days": rows,
+    }
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# server reads these at import; nothing here talks to Mongo
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+for key, value in (("MAIL_FROM", "bench@example.com"), ("MAIL_SERVER", "localhost"),
+                   ("MAIL_USERNAME", "bench"), ("MAIL_PASSWORD", "bench")):
+    os.environ.setdefault(key, value)
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+import server  # noqa: E402
+
+
+# Per-request authentication overhead. Replays a stream of requests drawn
+# from a pool of live tokens and reports microseconds per request for:
+#   scan    - verify the JWT, then scan a user list for the sub (the old path)
+#   verify  - verify the JWT, then look the sub up by id
+#   cached  - get_current_user with the verified-token cache warm
+#   python bench_auth.py --users 1000 --tokens 5000 --requests 200000
+
+
+def legacy_lookup(token, user_list):
+    payload = server.jwt.decode(token, server.SECRET_KEY, algorithms=[server.ALGORITHM])
+    uid = payload["sub"]
+    for u in user_list:
+        if u["id"] == uid:
+            return server.User(id=u["id"], username=u["username"], name=u["name"])
+    raise LookupError(uid)
+
+
+def indexed_lookup(token, by_id):
+    payload = server.decode_token(token)
+    u = by_id[payload["sub"]]
+    return server.User(id=u["id"], username=u["username"], name=u["name"])
+
+
+def timed(label, n, fn):
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<8}{elapsed / n * 1e6:>10.2f} us/request{n / elapsed:>14,.0f} req/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    user_list = [
+        {"id": f"u{i}", "username": f"user{i}", "name": f"User {i}"}
+        for i in range(args.users)
+    ]
+    server.users.by_id = {u["id"]: u for u in user_list}
+
+    tokens = [
+        server.create_token(random.choice(user_list)["id"])
+        for _ in range(args.tokens)
+    ]
+    stream = [random.choice(tokens) for _ in range(args.requests)]
+    creds = {
+        t: HTTPAuthorizationCredentials(scheme="Bearer", credentials=t)
+        for t in tokens
+    }
+
+    print(f"{args.users} users, {args.tokens} tokens, {args.requests} requests\n")
+
+    timed("scan", len(stream), lambda: [legacy_lookup(t, user_list) for t in stream])
+    timed("verify", len(stream), lambda: [indexed_lookup(t, server.users.by_id) for t in stream])
+
+    # warm the cache the way the first request of each token would
+    for t in tokens:
+        server.token_cache.put(t, indexed_lookup(t, server.users.by_id), None, time.time() + 3600)
+
+    async def cached():
+        for t in stream:
+            await server.get_current_user(creds[t])
+
+    timed("cached", len(stream), lambda: asyncio.run(cached()))
+    print(f"\ncache: {server.token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
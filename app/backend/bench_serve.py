@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+# Throughput benchmark for the `serve` entry point. Starts the API once per
+# configuration and drives it with keep-alive connections over raw sockets
+# (no client library overhead), then prints requests/s and latency.
+#   python bench_serve.py --workers 4 --path /api/contributors --token $JWT
+# Admission control is off unless --admission is given: every connection
+# shares one token, which the per-user rate limit would otherwise cap.
+
+HERE = Path(__file__).parent
+
+CONFIGS = {
+    "default": ["--workers", "1", "--loop", "asyncio", "--http", "h11"],
+    "tuned": ["--loop", "auto", "--http", "auto"],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n")
+                if s.recv(64).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(port, request, until, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < until:
+            t = time.perf_counter()
+            writer.write(request)
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - t)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def load(port, path, token, connections, seconds):
+    headers = f"GET {path} HTTP/1.1\r\nHost: bench\r\n"
+    if token:
+        headers += f"Authorization: Bearer {token}\r\n"
+    request = (headers + "\r\n").encode()
+
+    latencies, errors = [], []
+    until = time.perf_counter() + seconds
+    await asyncio.gather(*(
+        _client(port, request, until, latencies, errors)
+        for _ in range(connections)
+    ))
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "requests": n,
+        "rps": n / seconds,
+        "p50_ms": latencies[n // 2] * 1000 if n else 0,
+        "p99_ms": latencies[int(n * 0.99)] * 1000 if n else 0,
+        "errors": len(errors),
+    }
+
+
+def run(name, extra, args):
+    port = free_port()
+    cmd = [sys.executable, str(HERE / "cli.py"), "serve",
+           "--host", "127.0.0.1", "--port", str(port), *extra]
+    if name == "tuned":
+        cmd += ["--workers", str(args.workers)]
+
+    env = {
+        **os.environ,
+        "SCHEDULER_ENABLED": "0",
+        "ADMISSION_ENABLED": "1" if args.admission else "0",
+    }
+    proc = subprocess.Popen(cmd, cwd=HERE, env=env)
+    try:
+        wait_ready(port)
+        asyncio.run(load(port, args.path, args.token, args.connections, 2))  # warm up
+        return asyncio.run(load(port, args.path, args.token, args.connections, args.seconds))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=args.seconds + 30)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--token", default=os.getenv("BENCH_TOKEN"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--admission", action="store_true",
+                        help="keep admission control and its rate limits on")
+    args = parser.parse_args()
+
+    results = {name: run(name, extra, args) for name, extra in CONFIGS.items()}
+
+    print(f"{'config':<10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['rps']:>10.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+    if results["default"]["rps"]:
+        print(f"speedup: {results['tuned']['rps'] / results['default']['rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
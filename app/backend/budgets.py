@@ -0,0 +1,202 @@
+import os
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+
+# Per-category monthly budgets. Spend per (category, month) is a running
+# counter bumped atomically on every expense write, so checking a budget is
+# one counter update plus one budget lookup, never a scan of expenses.
+# An alert is recorded when a write moves spend across a threshold.
+# Recurring rows are not in the counters; thresholds are checked against
+# the counter plus their `virtual` spend, the figure report() shows.
+
+BUDGET_THRESHOLDS = [
+    float(t) for t in os.getenv("BUDGET_THRESHOLDS", "0.8,1.0").split(",")
+]
+
+
+def _amount(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def ensure_indexes(db):
+    key = [("category", ASCENDING), ("month", ASCENDING)]
+    await db.budgets.create_index(key, unique=True)
+    await db.category_spend.create_index(key, unique=True)
+    await db.budget_alerts.create_index([("month", ASCENDING), ("at", ASCENDING)])
+
+
+def crossed(before, after, budget, thresholds):
+    """Thresholds (fractions of budget) crossed going from before to after."""
+
+    if not budget or budget <= 0:
+        return []
+    return [t for t in thresholds if before < t * budget <= after]
+
+
+async def add_spend(db, category, month, delta, expense_id=None,
+                    virtual=None, replaced=0):
+    """Bump the counter by `delta` and record the thresholds crossed.
+
+    `virtual(category, month)` returns the spend of rows kept outside the
+    counters; `replaced` is the part of it the write stored as real rows,
+    so spend as reported only grew by delta - replaced.
+    """
+
+    if delta:
+        doc = await db.category_spend.find_one_and_update(
+            {"category": category, "month": month},
+            {"$inc": {"spent": delta}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    # grew > 0 implies delta > 0, so doc holds the counter
+    grew = delta - replaced
+    if grew <= 0:
+        return []
+
+    budget = await db.budgets.find_one({"category": category, "month": month})
+    if not budget:
+        return []
+
+    after = doc["spent"] + (await virtual(category, month) if virtual else 0)
+    before = after - grew
+
+    alerts = [
+        {
+            "category": category,
+            "month": month,
+            "threshold": t,
+            "budget": budget["amount"],
+            "spent": after,
+            "expense_id": expense_id,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        for t in crossed(before, after, budget["amount"],
+                         budget.get("thresholds") or BUDGET_THRESHOLDS)
+    ]
+    if alerts:
+        await db.budget_alerts.insert_many([dict(a) for a in alerts])
+    return alerts
+
+
+def _deltas(docs, sign=1, into=None):
+    deltas = {} if into is None else into
+    for d in docs:
+        if not d or not d.get("date"):
+            continue
+        key = (d.get("category"), d["date"][:7])
+        deltas[key] = deltas.get(key, 0) + sign * _amount(d.get("amount"))
+    return deltas
+
+
+async def apply_expense(db, before=None, after=None, virtual=None, replaced=None):
+    """Move spend from the old version of an expense to the new one.
+    `replaced` is the virtual row a newly stored occurrence stands for."""
+
+    deltas = _deltas([after], 1, _deltas([before], -1))
+    gone = _deltas([replaced])
+
+    expense_id = (after or before or {}).get("id")
+    alerts = []
+    for key in deltas.keys() | gone.keys():
+        alerts += await add_spend(
+            db, *key, deltas.get(key, 0), expense_id, virtual, gone.get(key, 0)
+        )
+    return alerts
+
+
+async def apply_many(db, docs, virtual=None, replaced=()):
+    """Counter updates for a batch of inserted expenses, one per bucket."""
+
+    deltas = _deltas(docs)
+    gone = _deltas(replaced)
+
+    alerts = []
+    for key in deltas.keys() | gone.keys():
+        alerts += await add_spend(
+            db, *key, deltas.get(key, 0), None, virtual, gone.get(key, 0)
+        )
+    return alerts
+
+
+async def rebuild(db):
+    """Recompute spend counters from expenses (and archived months)."""
+
+    totals = {}
+    for coll in ("expenses", "expenses_archive"):
+        rows = await db[coll].aggregate([
+            {"$group": {
+                "_id": {
+                    "category": "$category",
+                    "month": {"$substr": ["$date", 0, 7]},
+                },
+                "spent": {"$sum": {"$toDouble": "$amount"}},
+            }},
+        ]).to_list(None)
+        for r in rows:
+            key = (r["_id"]["category"], r["_id"]["month"])
+            totals[key] = totals.get(key, 0) + r["spent"]
+
+    await db.category_spend.delete_many({})
+    if totals:
+        await db.category_spend.insert_many([
+            {"category": c, "month": m, "spent": s}
+            for (c, m), s in totals.items()
+        ])
+    return len(totals)
+
+
+async def set_budget(db, category, month, amount, thresholds=None):
+    await db.budgets.update_one(
+        {"category": category, "month": month},
+        {"$set": {"amount": amount, "thresholds": thresholds}},
+        upsert=True,
+    )
+
+
+async def delete_budget(db, category, month):
+    result = await db.budgets.delete_one({"category": category, "month": month})
+    return result.deleted_count > 0
+
+
+async def report(db, month, extra=()):
+    """Spend against budget for every budgeted or spent-in category.
+    `extra` are expense rows not counted in category_spend (recurring)."""
+
+    budgets = {
+        b["category"]: b
+        for b in await db.budgets.find({"month": month}).to_list(None)
+    }
+    spend = {
+        s["category"]: s["spent"]
+        for s in await db.category_spend.find({"month": month}).to_list(None)
+    }
+    for e in extra:
+        spend[e.get("category")] = spend.get(e.get("category"), 0) + _amount(e.get("amount"))
+
+    rows = []
+    for category in sorted(set(budgets) | set(spend), key=str):
+        budget = budgets.get(category, {}).get("amount")
+        spent = spend.get(category, 0)
+        rows.append({
+            "category": category,
+            "month": month,
+            "budget": budget,
+            "spent": spent,
+            "remaining": budget - spent if budget is not None else None,
+            "percent": round(spent / budget * 100, 1) if budget else None,
+            "over": budget is not None and spent > budget,
+        })
+    return rows
+
+
+async def alerts(db, month=None, limit=100):
+    q = {"month": month} if month else {}
+    return await db.budget_alerts.find(q, {"_id": 0}) \
+        .sort("at", -1).to_list(limit)
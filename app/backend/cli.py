@@ -0,0 +1,134 @@
+import asyncio
+import importlib.util
+import os
+from pathlib import Path
+
+import typer
+
+
+# Command line entry points for the backend.
+#   python cli.py serve --workers 4
+#   python cli.py import-ledger expenses ledger_2019.xlsx
+
+cli = typer.Typer(add_completion=False)
+
+
+@cli.callback()
+def main():
+    """Hostel finance backend commands."""
+
+
+def _have(module):
+    return importlib.util.find_spec(module) is not None
+
+
+@cli.command()
+def serve(
+    host: str = typer.Option(os.getenv("HOST", "0.0.0.0")),
+    port: int = typer.Option(int(os.getenv("PORT", "8000"))),
+    workers: int = typer.Option(
+        int(os.getenv("WEB_WORKERS", "1")), help="worker processes"
+    ),
+    loop: str = typer.Option("auto", help="auto, uvloop or asyncio"),
+    http: str = typer.Option("auto", help="auto, httptools or h11"),
+    keep_alive: int = typer.Option(
+        int(os.getenv("KEEP_ALIVE", "5")), help="idle keep-alive timeout (s)"
+    ),
+    backlog: int = typer.Option(
+        int(os.getenv("BACKLOG", "2048")), help="listen socket backlog"
+    ),
+    graceful_timeout: int = typer.Option(
+        int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        help="seconds to drain in-flight requests on shutdown",
+    ),
+    forwarded_allow_ips: str = typer.Option(
+        os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        help="proxy addresses trusted for X-Forwarded-For (the ingress)",
+    ),
+    scheduler: bool = typer.Option(
+        True, help="run the job scheduler in the workers"
+    ),
+):
+    """Run the API under uvicorn."""
+
+    import uvicorn
+
+    if loop not in ("auto", "uvloop", "asyncio"):
+        raise typer.BadParameter("must be auto, uvloop or asyncio", param_hint="--loop")
+    if http not in ("auto", "httptools", "h11"):
+        raise typer.BadParameter("must be auto, httptools or h11", param_hint="--http")
+    if loop == "uvloop" and not _have("uvloop"):
+        raise typer.BadParameter("uvloop is not installed", param_hint="--loop")
+    if http == "httptools" and not _have("httptools"):
+        raise typer.BadParameter("httptools is not installed", param_hint="--http")
+
+    # workers are spawned and import server themselves, so each builds its
+    # own Motor client and scheduler in the lifespan hook; nothing is
+    # created here and shared across the fork. Job leases keep scheduled
+    # runs to one per fire time however many workers schedule them.
+    os.environ["SCHEDULER_ENABLED"] = "1" if scheduler else "0"
+
+    uvicorn.run(
+        "server:app",
+        app_dir=str(Path(__file__).parent),
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=keep_alive,
+        backlog=backlog,
+        timeout_graceful_shutdown=graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=forwarded_allow_ips,
+        access_log=False,
+    )
+
+
+@cli.command("import-ledger")
+def import_ledger(
+    kind: str = typer.Argument(..., help="revenue or expenses"),
+    path: Path = typer.Argument(..., exists=True, dir_okay=False),
+    batch_size: int = typer.Option(None, help="rows per insert_many batch"),
+):
+    """Stream a CSV/XLSX ledger into Mongo."""
+
+    import server
+
+    if kind not in server.IMPORT_KINDS:
+        raise typer.BadParameter(f"kind must be one of {', '.join(server.IMPORT_KINDS)}")
+
+    async def run():
+        server.connect()
+        job = server.import_job(kind)
+        if batch_size:
+            job.batch_size = batch_size
+        await job.create(path.name, "cli")
+
+        task = asyncio.create_task(_run(job))
+        while not task.done():
+            await asyncio.sleep(1)
+            typer.echo(f"\rrows {job.rows}  inserted {job.inserted}  failed {job.failed}", nl=False)
+        typer.echo()
+
+        result = task.result()
+        server.client.close()
+        return result
+
+    async def _run(job):
+        with open(path, "rb") as fh:
+            return await job.run(fh, path.name)
+
+    result = asyncio.run(run())
+
+    typer.echo(f"{result['status']}: {result['inserted']} inserted, {result['failed']} failed")
+    for e in result["errors"][:20]:
+        typer.echo(f"  row {e['row']}: {e['error']}")
+    if result["failed"] > 20:
+        typer.echo(f"  ... see import_jobs id={result['id']} for the full report")
+
+    raise typer.Exit(0 if result["status"] == "done" else 1)
+
+
+if __name__ == "__main__":
+    cli()
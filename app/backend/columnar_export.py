@@ -0,0 +1,211 @@
+import asyncio
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+# Columnar exports for bulk analytics. Rows are read from batched cursors
+# with a projection and appended straight into per-column lists; every
+# COLUMNAR_BATCH_ROWS rows become one Arrow record batch, which is written
+# out (Parquet row group or IPC stream message) before the next is read.
+# Memory is bounded by the batch size, whatever the date range.
+
+COLUMNAR_BATCH_ROWS = int(os.getenv("COLUMNAR_BATCH_ROWS", "50000"))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+KINDS = ("revenue", "contributions", "expenses")
+
+SCHEMAS = {
+    "revenue": pa.schema([
+        ("id", pa.string()),
+        ("date", pa.date32()),
+        ("cash_amount", pa.float64()),
+        ("contribution_total", pa.float64()),
+        ("total_revenue", pa.float64()),
+        ("contributors", pa.int32()),
+        ("created_at", pa.string()),
+    ]),
+    # one row per contribution of every revenue entry
+    "contributions": pa.schema([
+        ("revenue_id", pa.string()),
+        ("date", pa.date32()),
+        ("name", pa.string()),
+        ("amount", pa.float64()),
+    ]),
+    "expenses": pa.schema([
+        ("id", pa.string()),
+        ("date", pa.date32()),
+        ("category", pa.string()),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("remarks", pa.string()),
+        ("template_id", pa.string()),
+        ("paid", pa.bool_()),
+        ("virtual", pa.bool_()),
+        ("created_at", pa.string()),
+    ]),
+}
+
+PROJECTIONS = {
+    "revenue": {
+        "_id": 0, "id": 1, "date": 1, "cash_amount": 1, "total_revenue": 1,
+        "contributions": 1, "created_at": 1,
+    },
+    "contributions": {"_id": 0, "id": 1, "date": 1, "contributions": 1},
+    "expenses": {
+        "_id": 0, "id": 1, "date": 1, "category": 1, "description": 1,
+        "amount": 1, "remarks": 1, "template_id": 1, "paid": 1, "created_at": 1,
+    },
+}
+
+SOURCES = {
+    "revenue": ("revenue", "revenue_archive"),
+    "contributions": ("revenue", "revenue_archive"),
+    "expenses": ("expenses", "expenses_archive"),
+}
+
+
+def _num(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class Columns:
+    """Per-column value lists for one record batch."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.schema = SCHEMAS[kind]
+        self.cols = {name: [] for name in self.schema.names}
+        self.rows = 0
+
+    def add(self, d):
+        c = self.cols
+
+        if self.kind == "contributions":
+            for p in d.get("contributions") or []:
+                c["revenue_id"].append(d.get("id"))
+                c["date"].append(d.get("date"))
+                c["name"].append(p.get("name"))
+                c["amount"].append(_num(p.get("amount")))
+                self.rows += 1
+            return
+
+        c["id"].append(d.get("id"))
+        c["date"].append(d.get("date"))
+        c["created_at"].append(d.get("created_at"))
+
+        if self.kind == "revenue":
+            contributions = d.get("contributions") or []
+            # not stored; summed like the Excel export does
+            c["cash_amount"].append(_num(d.get("cash_amount")))
+            c["contribution_total"].append(
+                sum(_num(p.get("amount")) or 0.0 for p in contributions)
+            )
+            c["total_revenue"].append(_num(d.get("total_revenue")))
+            c["contributors"].append(len(contributions))
+        else:
+            c["category"].append(d.get("category"))
+            c["description"].append(d.get("description"))
+            c["amount"].append(_num(d.get("amount")))
+            c["remarks"].append(d.get("remarks"))
+            c["template_id"].append(d.get("template_id"))
+            c["paid"].append(bool(d.get("paid")))
+            c["virtual"].append(bool(d.get("virtual")))
+        self.rows += 1
+
+    def batch(self):
+        arrays = []
+        for field in self.schema:
+            values = self.cols[field.name]
+            if field.name == "date":
+                arr = pc.strptime(
+                    pa.array(values, pa.string()),
+                    format="%Y-%m-%d", unit="s", error_is_null=True,
+                ).cast(pa.date32())
+            else:
+                arr = pa.array(values, field.type)
+            arrays.append(arr)
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+async def batches(db, kind, start, end, extra=(), batch_rows=COLUMNAR_BATCH_ROWS):
+    """Record batches of `kind` rows dated start..end (YYYY-MM-DD), from the
+    live and archived collections plus `extra` rows (virtual recurring)."""
+
+    q = {"date": {"$gte": start, "$lte": end}}
+    cols = Columns(kind)
+
+    for coll in SOURCES[kind]:
+        cursor = db[coll].find(q, PROJECTIONS[kind]).batch_size(
+            min(batch_rows, 10000)
+        )
+        async for d in cursor:
+            cols.add(d)
+            if cols.rows >= batch_rows:
+                yield cols.batch()
+                cols = Columns(kind)
+
+    for d in extra:
+        cols.add(d)
+
+    if cols.rows:
+        yield cols.batch()
+
+
+async def write_parquet(path, db, kind, start, end, extra=(),
+                        compression=PARQUET_COMPRESSION):
+    """Write a Parquet file, one row group per batch; encoding runs in a
+    thread so the event loop keeps serving."""
+
+    rows = 0
+    with pq.ParquetWriter(path, SCHEMAS[kind], compression=compression) as writer:
+        async for batch in batches(db, kind, start, end, extra):
+            await asyncio.to_thread(writer.write_batch, batch)
+            rows += batch.num_rows
+    return rows
+
+
+class _Chunks:
+    """Write-only file object handing back what was written since the last
+    take(), so the IPC stream goes out without being accumulated."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        out = b"".join(self.parts)
+        self.parts = []
+        return out
+
+
+async def arrow_stream(db, kind, start, end, extra=(), compression="zstd"):
+    """Yield an Arrow IPC stream chunk by chunk: schema, then one message
+    per batch, then the end-of-stream marker."""
+
+    sink = _Chunks()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), SCHEMAS[kind], options=options)
+
+    async for batch in batches(db, kind, start, end, extra):
+        await asyncio.to_thread(writer.write_batch, batch)
+        yield sink.take()
+
+    writer.close()
+    yield sink.take()
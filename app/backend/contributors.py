@@ -0,0 +1,153 @@
+from pymongo import ASCENDING, UpdateOne
+
+
+# Per-contributor, per-month totals maintained on every revenue write,
+# so contributor reports never have to $unwind the revenue history.
+
+def _month_totals(doc):
+    month = (doc.get("date") or "")[:7]
+    totals = {}
+
+    for c in doc.get("contributions", []):
+        name = c.get("name")
+        if not name:
+            continue
+        t, n = totals.get(name, (0, 0))
+        totals[name] = (t + c.get("amount", 0), n + 1)
+
+    return month, totals
+
+
+async def ensure_indexes(db):
+    await db.contributor_totals.create_index(
+        [("name", ASCENDING), ("month", ASCENDING)], unique=True
+    )
+    await db.contributor_totals.create_index("month")
+
+
+async def apply_revenue(db, doc, sign=1):
+    """Add (sign=1) or remove (sign=-1) a revenue doc's contributions."""
+
+    await apply_many(db, [doc], sign)
+
+
+async def apply_many(db, docs, sign=1):
+    """apply_revenue for a batch, one update per (name, month)."""
+
+    merged = {}
+    for doc in docs:
+        month, totals = _month_totals(doc)
+        for name, (t, n) in totals.items():
+            mt, mn = merged.get((name, month), (0, 0))
+            merged[(name, month)] = (mt + t, mn + n)
+
+    if not merged:
+        return
+
+    ops = [
+        UpdateOne(
+            {"name": name, "month": month},
+            {"$inc": {"total": sign * t, "count": sign * n}},
+            upsert=True,
+        )
+        for (name, month), (t, n) in merged.items()
+    ]
+    await db.contributor_totals.bulk_write(ops, ordered=False)
+
+    if sign < 0:
+        await db.contributor_totals.delete_many({
+            "name": {"$in": list({name for name, _ in merged})},
+            "month": {"$in": list({month for _, month in merged})},
+            "count": {"$lte": 0},
+        })
+
+
+async def rebuild(db):
+    """Recompute the ledger from scratch (one-off $unwind of revenue)."""
+
+    merged = {}
+
+    # closed months keep their revenue in revenue_archive
+    for coll in ("revenue", "revenue_archive"):
+        rows = await db[coll].aggregate([
+            {"$unwind": "$contributions"},
+            # unnamed contributions (imported totals) have no contributor
+            {"$match": {"contributions.name": {"$nin": [None, ""]}}},
+            {"$group": {
+                "_id": {
+                    "name": "$contributions.name",
+                    "month": {"$substr": ["$date", 0, 7]},
+                },
+                "total": {"$sum": "$contributions.amount"},
+                "count": {"$sum": 1},
+            }},
+        ]).to_list(None)
+
+        for r in rows:
+            key = (r["_id"]["name"], r["_id"]["month"])
+            t, n = merged.get(key, (0, 0))
+            merged[key] = (t + r["total"], n + r["count"])
+
+    await db.contributor_totals.delete_many({})
+
+    if merged:
+        await db.contributor_totals.insert_many([
+            {"name": name, "month": month, "total": t, "count": n}
+            for (name, month), (t, n) in merged.items()
+        ])
+
+    return len(merged)
+
+
+def _period_match(year=None):
+    if year:
+        return {"month": {"$gte": f"{year}-01", "$lte": f"{year}-12"}}
+    return {}
+
+
+async def leaderboard(db, year=None):
+
+    rows = await db.contributor_totals.aggregate([
+        {"$match": _period_match(year)},
+        {"$group": {
+            "_id": "$name",
+            "total": {"$sum": "$total"},
+            "count": {"$sum": "$count"},
+            "months": {"$sum": 1},
+        }},
+        {"$sort": {"total": -1, "_id": 1}},
+    ]).to_list(None)
+
+    return [
+        {
+            "rank": i + 1,
+            "name": r["_id"],
+            "total": r["total"],
+            "count": r["count"],
+            "months": r["months"],
+        }
+        for i, r in enumerate(rows)
+    ]
+
+
+async def contributor_history(db, name, year=None):
+
+    history = await db.contributor_totals.find(
+        {"name": name, **_period_match(year)},
+        {"_id": 0, "month": 1, "total": 1, "count": 1},
+    ).sort("month", 1).to_list(None)
+
+    if not history:
+        return None
+
+    board = await leaderboard(db, year)
+    rank = next((r["rank"] for r in board if r["name"] == name), None)
+
+    return {
+        "name": name,
+        "total": sum(h["total"] for h in history),
+        "count": sum(h["count"] for h in history),
+        "rank": rank,
+        "contributors": len(board),
+        "history": history,
+    }
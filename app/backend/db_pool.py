@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring, read_preferences
+
+
+# Mongo client construction, pool warm-up and pool statistics. The client
+# is created by the application lifespan, not at import time, so every
+# worker builds its own pool after forking and before taking traffic.
+# Report and export reads go through a second database handle with its own
+# read preference (secondaryPreferred by default, bounded staleness).
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")
+)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+MONGO_REPORT_READ_PREFERENCE = os.getenv(
+    "MONGO_REPORT_READ_PREFERENCE", "secondaryPreferred"
+)
+# Mongo's minimum is 90s; -1 means no bound
+MONGO_REPORT_MAX_STALENESS_S = int(os.getenv("MONGO_REPORT_MAX_STALENESS_S", "90"))
+
+READ_PREFERENCES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "2"))
+READY_MAX_LATENCY_MS = float(os.getenv("READY_MAX_LATENCY_MS", "500"))
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts pool connections from pymongo's CMAP events."""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+        self.checkouts = defaultdict(int)   # per server, shows read routing
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.created += 1
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.closed += 1
+        self.open = max(self.open - 1, 0)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+        self.checkouts["%s:%s" % event.address] += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out = max(self.checked_out - 1, 0)
+
+    def stats(self):
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "open": self.open,
+            "in_use": self.checked_out,
+            "idle": max(self.open - self.checked_out, 0),
+            "utilization": round(self.checked_out / MONGO_MAX_POOL_SIZE, 3),
+            "created": self.created,
+            "closed": self.closed,
+            "checkout_failures": self.checkout_failures,
+            "cleared": self.cleared,
+            "checkouts_by_server": dict(self.checkouts),
+        }
+
+
+def create_client(url, monitor, **overrides):
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [monitor],
+        **overrides,
+    }
+    return AsyncIOMotorClient(url, **options)
+
+
+def report_read_preference(mode=MONGO_REPORT_READ_PREFERENCE,
+                           max_staleness=MONGO_REPORT_MAX_STALENESS_S):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"unknown read preference {mode!r}")
+    if mode == "primary":
+        return read_preferences.Primary()
+    return READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+def report_database(client, name):
+    """Handle for report/export reads; writes must use the primary handle."""
+
+    return client.get_database(name, read_preference=report_read_preference())
+
+
+async def ping(db):
+    """Round-trip a ping and return its latency in milliseconds."""
+
+    t0 = time.perf_counter()
+    await asyncio.wait_for(db.command("ping"), READY_TIMEOUT_SECONDS)
+    return (time.perf_counter() - t0) * 1000
+
+
+async def warm_up(db, connections=MONGO_MIN_POOL_SIZE):
+    """Open `connections` pooled sockets by pinging concurrently."""
+
+    await db.command("ping")
+    if connections > 1:
+        await asyncio.gather(*[db.command("ping") for _ in range(connections)])
@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from report_excel import build_range_workbook
+
+
+# Background multi-month exports. A job fetches each month's rows, renders
+# one workbook in a process pool (openpyxl is CPU bound and would block the
+# event loop), and stores the file in GridFS keyed by the range and the
+# months' revisions, so an unchanged range is served from the stored file.
+# A new file for a range replaces the older ones, which can't be served
+# again once their revisions have moved on. They are kept for a grace
+# period after they finished or were last downloaded, so a client that
+# was handed one can still fetch it.
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_FETCH_CONCURRENCY = int(os.getenv("EXPORT_FETCH_CONCURRENCY", "4"))
+EXPORT_MAX_MONTHS = int(os.getenv("EXPORT_MAX_MONTHS", "60"))
+EXPORT_JOB_TIMEOUT_MINUTES = int(os.getenv("EXPORT_JOB_TIMEOUT_MINUTES", "30"))
+EXPORT_RETENTION_MINUTES = int(os.getenv("EXPORT_RETENTION_MINUTES", "60"))
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def month_range(start, end):
+    if not (MONTH_RE.match(start or "") and MONTH_RE.match(end or "")):
+        raise ValueError("months must be YYYY-MM")
+
+    y, m = int(start[:4]), int(start[5:7])
+    last = int(end[:4]), int(end[5:7])
+    months = []
+
+    while (y, m) <= last:
+        months.append(f"{y:04d}-{m:02d}")
+        m += 1
+        if m > 12:
+            y, m = y + 1, 1
+
+    return months
+
+
+class ExportQueue:
+
+    def __init__(self, db=None, workers=EXPORT_WORKERS):
+        self.db = db
+        self.workers = workers
+        self._pool = None
+        self._tasks = set()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn, not fork: the parent holds Motor's threads and sockets
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    @property
+    def files(self):
+        return AsyncIOMotorGridFSBucket(self.db, bucket_name="exports")
+
+    def shutdown(self):
+        for t in self._tasks:
+            t.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def ensure_indexes(self):
+        await self.db.export_jobs.create_index("cache_key")
+        await self.db.export_jobs.create_index("created_at")
+        await self.db.export_jobs.create_index([("start", 1), ("end", 1)])
+
+    async def _cache_key(self, months):
+        # "templates" is bumped on recurring template changes, which can
+        # alter any open month
+        keys = months + ["templates"]
+        revs = await self.db.month_revisions.find(
+            {"_id": {"$in": keys}}
+        ).to_list(None)
+        rev_map = {r["_id"]: r.get("rev", 0) for r in revs}
+        raw = ",".join(f"{m}:{rev_map.get(m, 0)}" for m in keys)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    async def submit(self, start, end, user_id, fetch_month):
+        """Queue an export of start..end (YYYY-MM) and return the job doc.
+
+        `fetch_month(month)` returns (revenue_rows, expense_rows, summary)
+        for one month.
+        """
+
+        months = month_range(start, end)
+        if not months or len(months) > EXPORT_MAX_MONTHS:
+            raise ValueError(f"range must cover 1 to {EXPORT_MAX_MONTHS} months")
+
+        cache_key = await self._cache_key(months)
+
+        # reuse a finished file, or join a job still in progress; jobs
+        # left running by a dead worker stop matching after the timeout
+        stale = datetime.now(timezone.utc) - timedelta(minutes=EXPORT_JOB_TIMEOUT_MINUTES)
+        cached = await self.db.export_jobs.find_one(
+            {
+                "cache_key": cache_key,
+                "$or": [
+                    {"status": "done"},
+                    {
+                        "status": {"$in": ["queued", "running"]},
+                        "created_at": {"$gte": stale.isoformat()},
+                    },
+                ],
+            },
+            {"_id": 0},
+            sort=[("created_at", -1)],
+        )
+        if cached:
+            return cached
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "start": start,
+            "end": end,
+            "months": len(months),
+            "done_months": 0,
+            "status": "queued",
+            "cache_key": cache_key,
+            "file_id": None,
+            "error": None,
+            "created_by": user_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+        }
+        await self.db.export_jobs.insert_one(dict(job))
+
+        task = asyncio.create_task(self._run(job, months, fetch_month))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return job
+
+    async def _set(self, job_id, **fields):
+        await self.db.export_jobs.update_one({"id": job_id}, {"$set": fields})
+
+    async def _run(self, job, months, fetch_month):
+        job_id = job["id"]
+
+        try:
+            await self._set(job_id, status="running")
+
+            sem = asyncio.Semaphore(EXPORT_FETCH_CONCURRENCY)
+            done = 0
+
+            async def fetch(month):
+                nonlocal done
+                async with sem:
+                    revenue, expenses, summary = await fetch_month(month)
+                done += 1
+                await self.db.export_jobs.update_one(
+                    {"id": job_id}, {"$max": {"done_months": done}}
+                )
+                return month, revenue, expenses, summary
+
+            data = await asyncio.gather(*[fetch(m) for m in months])
+
+            loop = asyncio.get_running_loop()
+            content = await loop.run_in_executor(
+                self.pool, build_range_workbook, data
+            )
+
+            file_id = await self.files.upload_from_stream(
+                self.filename(job), content,
+                metadata={"job_id": job_id, "cache_key": job["cache_key"]},
+            )
+
+            await self._set(
+                job_id,
+                status="done",
+                file_id=str(file_id),
+                size=len(content),
+                finished_at=datetime.now(timezone.utc).isoformat(),
+            )
+            await self._prune(job)
+        except Exception as e:
+            await self._set(
+                job_id,
+                status="failed",
+                error=str(e),
+                finished_at=datetime.now(timezone.utc).isoformat(),
+            )
+
+    async def _prune(self, job):
+        """Drop the finished exports of the same range that came before
+        `job`, with their files, once they are past the grace period."""
+
+        cutoff = (
+            datetime.now(timezone.utc) - timedelta(minutes=EXPORT_RETENTION_MINUTES)
+        ).isoformat()
+        old = await self.db.export_jobs.find(
+            {
+                "start": job["start"],
+                "end": job["end"],
+                "id": {"$ne": job["id"]},
+                "status": {"$in": ["done", "failed"]},
+                "created_at": {"$lte": job["created_at"]},
+                "finished_at": {"$lt": cutoff},
+                "$or": [{"used_at": None}, {"used_at": {"$lt": cutoff}}],
+            },
+            {"_id": 0, "id": 1, "file_id": 1},
+        ).to_list(None)
+
+        for j in old:
+            if j.get("file_id"):
+                try:
+                    await self.files.delete(ObjectId(j["file_id"]))
+                except NoFile:
+                    pass
+            await self.db.export_jobs.delete_one({"id": j["id"]})
+
+    @staticmethod
+    def filename(job):
+        return f"ledger_{job['start']}_{job['end']}.xlsx"
+
+    async def get(self, job_id):
+        return await self.db.export_jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def open(self, job):
+        await self._set(job["id"], used_at=datetime.now(timezone.utc).isoformat())
+        return await self.files.open_download_stream(ObjectId(job["file_id"]))
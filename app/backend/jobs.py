@@ -0,0 +1,238 @@
+import asyncio
+import os
+import socket
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+
+# Coordinates scheduled jobs across workers and replicas. Every process
+# runs the same APScheduler triggers, but a job only runs in the process
+# that takes its Mongo lease for that fire time. Runs are recorded in
+# job_runs, and fire times missed while no worker was up are caught up.
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_CATCHUP_MINUTES = int(os.getenv("JOB_CATCHUP_MINUTES", "15"))
+JOB_MAX_CATCHUP = int(os.getenv("JOB_MAX_CATCHUP", "12"))
+
+
+def _utc(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+class JobCoordinator:
+
+    def __init__(self, db, lease_seconds=JOB_LEASE_SECONDS):
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+
+    async def ensure_indexes(self):
+        await self.db.job_leases.create_index("expires_at", expireAfterSeconds=0)
+        await self.db.job_runs.create_index(
+            [("job", ASCENDING), ("fire_time", DESCENDING)]
+        )
+
+    def register(self, scheduler, name, func, trigger):
+        """Schedule func(fire_time) on trigger, guarded by the lease."""
+
+        self.jobs[name] = (func, trigger)
+        scheduler.add_job(self.tick, trigger, args=[name], id=name,
+                          replace_existing=True)
+
+    def add_catchup(self, scheduler):
+        scheduler.add_job(self.catch_up, "interval",
+                          minutes=JOB_CATCHUP_MINUTES, id="job-catchup",
+                          replace_existing=True)
+
+    # ---------- leases ----------
+
+    async def acquire(self, key):
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.job_leases.update_one(
+                {"_id": key, "expires_at": {"$lt": now}},
+                {"$set": {
+                    "owner": self.owner,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=self.lease_seconds),
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def renew(self, key):
+        await self.db.job_leases.update_one(
+            {"_id": key, "owner": self.owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc)
+                      + timedelta(seconds=self.lease_seconds)}},
+        )
+
+    async def release(self, key):
+        await self.db.job_leases.delete_one({"_id": key, "owner": self.owner})
+
+    async def _heartbeat(self, key):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.renew(key)
+
+    # ---------- scheduling ----------
+
+    async def _last_fire(self, name):
+        state = await self.db.job_state.find_one({"_id": name})
+        if state:
+            return _utc(state["last_fire"])
+
+        # first deployment of this job: start tracking from now rather
+        # than replaying its whole history
+        now = datetime.now(timezone.utc)
+        await self.db.job_state.update_one(
+            {"_id": name}, {"$setOnInsert": {"last_fire": now}}, upsert=True
+        )
+        state = await self.db.job_state.find_one({"_id": name})
+        return _utc(state["last_fire"])
+
+    def due_fire_times(self, trigger, since, now):
+        fires = []
+        t = trigger.get_next_fire_time(None, since + timedelta(seconds=1))
+
+        while t and _utc(t) <= now:
+            fires.append(t)
+            t = trigger.get_next_fire_time(t, t + timedelta(seconds=1))
+
+        return fires[-JOB_MAX_CATCHUP:]
+
+    async def tick(self, name):
+        """Run every due, not yet completed fire time of a job, in order."""
+
+        func, trigger = self.jobs[name]
+        since = await self._last_fire(name)
+        now = datetime.now(timezone.utc)
+
+        for fire in self.due_fire_times(trigger, since, now):
+            if not await self.run_once(name, func, fire):
+                break
+
+    async def catch_up(self):
+        for name in self.jobs:
+            await self.tick(name)
+
+    async def run_once(self, name, func, fire_time):
+        """Run one fire time of a job under its lease.
+
+        Returns False when the run failed or another worker holds the
+        lease, so later fire times wait for this one.
+        """
+
+        fire_utc = _utc(fire_time)
+        key = f"{name}@{fire_utc.isoformat()}"
+
+        if not await self.acquire(key):
+            return False
+
+        try:
+            done = await self.db.job_runs.find_one(
+                {"_id": key, "status": "success"}
+            )
+            if done:
+                return True
+
+            started = datetime.now(timezone.utc)
+            t0 = time.perf_counter()
+            await self.db.job_runs.update_one(
+                {"_id": key},
+                {
+                    "$set": {
+                        "job": name,
+                        "fire_time": fire_utc,
+                        "owner": self.owner,
+                        "status": "running",
+                        "started_at": started,
+                        "error": None,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                upsert=True,
+            )
+
+            heartbeat = asyncio.create_task(self._heartbeat(key))
+            try:
+                await func(fire_time)
+                status, error = "success", None
+            except Exception:
+                status, error = "failed", traceback.format_exc()
+            finally:
+                heartbeat.cancel()
+
+            await self.db.job_runs.update_one(
+                {"_id": key},
+                {"$set": {
+                    "status": status,
+                    "error": error,
+                    "finished_at": datetime.now(timezone.utc),
+                    "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+                }},
+            )
+
+            if status != "success":
+                return False
+
+            await self.db.job_state.update_one(
+                {"_id": name}, {"$max": {"last_fire": fire_utc}}, upsert=True
+            )
+            return True
+        finally:
+            await self.release(key)
+
+    async def once(self, name, func):
+        """Run func() once per database, e.g. a startup backfill.
+
+        Workers that lose the lease wait until the winner records success,
+        so none starts serving (and writing) while it runs. A failure is
+        raised in the worker that ran it; the others then take the lease.
+        """
+
+        key = f"once:{name}"
+        done = {"_id": key, "status": "success"}
+
+        while not await self.db.job_runs.find_one(done, {"_id": 1}):
+            if not await self.acquire(key):
+                await asyncio.sleep(1)
+                continue
+
+            heartbeat = asyncio.create_task(self._heartbeat(key))
+            try:
+                if await self.db.job_runs.find_one(done, {"_id": 1}):
+                    return
+                started = datetime.now(timezone.utc)
+                await func()
+                await self.db.job_runs.update_one(
+                    {"_id": key},
+                    {"$set": {
+                        "job": name,
+                        "owner": self.owner,
+                        "status": "success",
+                        "started_at": started,
+                        "finished_at": datetime.now(timezone.utc),
+                    }},
+                    upsert=True,
+                )
+            finally:
+                heartbeat.cancel()
+                await self.release(key)
+
+    async def recent_runs(self, name=None, limit=50):
+        q = {"job": name} if name else {}
+        return await self.db.job_runs.find(q, {"_id": 0}) \
+            .sort("fire_time", -1).to_list(limit)
@@ -0,0 +1,325 @@
+import asyncio
+import csv
+import io
+import os
+import re
+import threading
+import uuid
+from datetime import date, datetime, timezone
+
+from openpyxl import load_workbook
+from pydantic import ValidationError
+
+
+# Streaming ledger import from CSV or XLSX. A reader thread parses the file
+# row by row (csv module / openpyxl read-only mode) and hands validated
+# batches to the event loop through a small bounded queue, so the next
+# batch is parsed while the previous insert_many is in flight and memory
+# stays flat whatever the file size.
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_QUEUE_BATCHES = int(os.getenv("IMPORT_QUEUE_BATCHES", "4"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+REVENUE_FIELDS = {"date", "cash_amount", "contributions"}
+EXPENSE_FIELDS = {"date", "category", "description", "amount", "remarks"}
+
+# export column headers map onto model fields, so exported files re-import
+ALIASES = {
+    "cash": "cash_amount",
+    "cash_amount": "cash_amount",
+    "contribution_total": "contribution_total",
+    "total_revenue": "total_revenue",
+    "total": "total_revenue",
+}
+
+# totals in exported revenue files; checked against the row, never stored
+REVENUE_TOTALS = {"contribution_total", "total_revenue"}
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _key(header):
+    """Model field for a known column, else the header itself (a
+    contributor name in revenue files)."""
+
+    raw = str(header or "").strip()
+    k = raw.lower().replace(" ", "_")
+    if k in ALIASES:
+        return ALIASES[k]
+    return k if k in REVENUE_FIELDS | EXPENSE_FIELDS | REVENUE_TOTALS else raw
+
+
+def _cell(v):
+    if isinstance(v, datetime):
+        return v.date().isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, str):
+        return v.strip()
+    return v
+
+
+def iter_csv(fh):
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    yield header
+    yield from reader
+
+
+def iter_xlsx(fh):
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def iter_rows(fh, filename):
+    """Yield (row_number, {column: value}) from a CSV or XLSX stream."""
+
+    rows = iter_xlsx(fh) if filename.lower().endswith(".xlsx") else iter_csv(fh)
+
+    header = next(rows, None)
+    if header is None:
+        return
+    keys = [_key(h) for h in header]
+
+    for n, row in enumerate(rows, start=2):
+        values = {k: _cell(v) for k, v in zip(keys, row) if k}
+        if any(v not in (None, "") for v in values.values()):
+            yield n, values
+
+
+def _blank(v):
+    try:
+        return v is None or v == "" or float(v) == 0
+    except (TypeError, ValueError):
+        return False
+
+
+def revenue_fields(values):
+    """Wide revenue rows: any column that is not a revenue field is a
+    contributor name holding that person's amount."""
+
+    contributions = [
+        {"name": h, "amount": v}
+        for h, v in values.items()
+        if h not in REVENUE_FIELDS | REVENUE_TOTALS and not _blank(v)
+    ]
+    return {
+        "date": values.get("date"),
+        "cash_amount": values.get("cash_amount") or 0,
+        "contributions": contributions,
+    }
+
+
+def _close(a, b):
+    return abs(a - b) < 0.005
+
+
+def revenue_totals(data, values):
+    """Reconcile a validated revenue row with its total columns, if any;
+    returns (row, error).
+
+    A Contribution Total above the named contributions (an exported file
+    has no per-person columns) becomes one unnamed contribution; any other
+    mismatch is the row's error.
+    """
+
+    named = sum(c.amount for c in data.contributions)
+
+    listed = values.get("contribution_total")
+    if listed not in (None, ""):
+        try:
+            listed = float(listed)
+        except (TypeError, ValueError):
+            return data, f"contribution_total: not a number: {listed!r}"
+        if listed < named and not _close(listed, named):
+            return data, (
+                f"contribution_total: {listed:g} is less than the contributions ({named:g})"
+            )
+        if not _close(listed, named):
+            fields = data.model_dump()
+            fields["contributions"].append({"name": "", "amount": round(listed - named, 2)})
+            data = type(data)(**fields)
+
+    total = values.get("total_revenue")
+    if total not in (None, ""):
+        try:
+            total = float(total)
+        except (TypeError, ValueError):
+            return data, f"total_revenue: not a number: {total!r}"
+        actual = data.cash_amount + sum(c.amount for c in data.contributions)
+        if not _close(total, actual):
+            return data, (
+                f"total_revenue: {total:g} does not match cash + contributions ({actual:g})"
+            )
+
+    return data, None
+
+
+class ImportJob:
+
+    def __init__(self, db, kind, model, build_doc, after_insert, is_closed,
+                 batch_size=IMPORT_BATCH_SIZE):
+        self.db = db
+        self.kind = kind
+        self.model = model
+        self.build_doc = build_doc
+        self.after_insert = after_insert
+        self.is_closed = is_closed
+        self.batch_size = batch_size
+        self.id = str(uuid.uuid4())
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.closed_months = {}
+        self._stop = threading.Event()
+
+    def _error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def _validate(self, n, values):
+        if self.kind == "revenue":
+            fields = revenue_fields(values)
+        else:
+            fields = {k: values.get(k) for k in EXPENSE_FIELDS}
+            if fields["remarks"] is None:
+                fields["remarks"] = ""
+
+        if not DATE_RE.match(str(fields["date"] or "")):
+            self._error(n, f"date: expected YYYY-MM-DD, got {fields['date']!r}")
+            return None
+
+        try:
+            data = self.model(**fields)
+        except ValidationError as e:
+            self._error(n, "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            ))
+            return None
+
+        if self.kind == "revenue":
+            data, error = revenue_totals(data, values)
+            if error:
+                self._error(n, error)
+                return None
+
+        return data
+
+    def _produce(self, fh, filename, loop, queue):
+        """Reader thread: parse, validate and enqueue batches."""
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        try:
+            batch = []
+            for n, values in iter_rows(fh, filename):
+                if self._stop.is_set():
+                    return
+                self.rows += 1
+                data = self._validate(n, values)
+                if data is not None:
+                    batch.append((n, data))
+                if len(batch) >= self.batch_size:
+                    put(batch)
+                    batch = []
+            if batch:
+                put(batch)
+            put(None)
+        except Exception as e:
+            put(e)
+
+    async def _month_closed(self, month):
+        if month not in self.closed_months:
+            self.closed_months[month] = await self.is_closed(month)
+        return self.closed_months[month]
+
+    async def _insert(self, batch):
+        docs = []
+        for n, data in batch:
+            if await self._month_closed(data.date[:7]):
+                self._error(n, f"Month {data.date[:7]} is closed")
+                continue
+            docs.append(data)
+
+        if not docs:
+            return
+
+        # build_doc reserves sync sequence numbers for the insert
+        async with self.build_doc(docs) as docs:
+            await self.db[self.kind].insert_many(docs, ordered=False)
+        # insert_many adds _id to the dicts; hooks see them like fetched docs
+        await self.after_insert(self.kind, docs)
+        self.inserted += len(docs)
+
+    async def _save(self, **fields):
+        await self.db.import_jobs.update_one(
+            {"id": self.id},
+            {"$set": {
+                "rows": self.rows,
+                "inserted": self.inserted,
+                "failed": self.failed,
+                "errors": self.errors,
+                **fields,
+            }},
+        )
+
+    async def create(self, filename, created_by=None):
+        await self.db.import_jobs.insert_one({
+            "id": self.id,
+            "kind": self.kind,
+            "filename": filename,
+            "status": "running",
+            "created_by": created_by,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+            "rows": 0,
+            "inserted": 0,
+            "failed": 0,
+            "errors": [],
+        })
+
+    async def run(self, fh, filename):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=IMPORT_QUEUE_BATCHES)
+        reader = threading.Thread(
+            target=self._produce, args=(fh, filename, loop, queue), daemon=True
+        )
+        reader.start()
+
+        status, error = "done", None
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                await self._insert(batch)
+                await self._save()
+        except Exception as e:
+            status, error = "failed", str(e)
+            self._stop.set()
+            # unblock the reader if it is waiting on a full queue
+            while reader.is_alive():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.05)
+
+        await self._save(
+            status=status,
+            error=error,
+            finished_at=datetime.now(timezone.utc).isoformat(),
+        )
+        return await self.db.import_jobs.find_one({"id": self.id}, {"_id": 0})
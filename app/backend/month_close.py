@@ -0,0 +1,211 @@
+import json
+import zlib
+from datetime import datetime, timezone
+
+from bson import Binary
+from pymongo import DeleteOne, ReplaceOne
+
+from month_engine import MonthSnapshot
+
+
+# Closing a month freezes it: totals, daily series, category breakdown and
+# the zlib-compressed raw rows go into one closed_months document, and the
+# raw revenue/expense documents move to *_archive collections so they drop
+# out of the hot working set. Reports for a closed month read the snapshot.
+
+def _pack(rows):
+    raw = json.dumps(rows, separators=(",", ":"), default=str).encode()
+    return Binary(zlib.compress(raw, 6))
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(bytes(blob)))
+
+
+class ClosedMonth:
+    """Read-only view of a closed_months document, shaped like MonthSnapshot."""
+
+    def __init__(self, doc):
+        self.month = doc["_id"]
+        self.doc = doc
+
+    def totals(self, lo=0, hi=None):
+        if lo == 0 and hi is None:
+            return dict(self.doc["totals"])
+
+        tr = te = 0.0
+        for date, r, e in self.daily():
+            day = int(date[8:10]) - 1
+            if day >= lo and (hi is None or day < hi):
+                tr += r
+                te += e
+
+        return {"total_revenue": tr, "total_expenses": te, "net_profit": tr - te}
+
+    def daily(self):
+        return [tuple(d) for d in self.doc["daily"]]
+
+    def category_breakdown(self):
+        return list(self.doc["category_data"])
+
+
+async def ensure_indexes(db):
+    await db.revenue_archive.create_index("date")
+    await db.expenses_archive.create_index("date")
+
+
+async def get_closed(db, month, rows=False):
+    projection = None if rows else {"revenue_rows": 0, "expense_rows": 0}
+    doc = await db.closed_months.find_one(
+        {"_id": month, "status": "closed"}, projection
+    )
+    return ClosedMonth(doc) if doc else None
+
+
+async def closed_rows(db, month, kind):
+    """Raw rows of a closed month; kind is "revenue" or "expenses"."""
+
+    field = "revenue_rows" if kind == "revenue" else "expense_rows"
+    doc = await db.closed_months.find_one(
+        {"_id": month, "status": "closed"}, {field: 1}
+    )
+    return _unpack(doc[field]) if doc else None
+
+
+async def is_closed(db, month):
+    return await db.closed_months.find_one(
+        {"_id": month, "status": {"$in": ["closing", "closed"]}}, {"_id": 1}
+    ) is not None
+
+
+async def list_closed(db):
+    return await db.closed_months.find(
+        {}, {"revenue_rows": 0, "expense_rows": 0, "daily": 0}
+    ).sort("_id", 1).to_list(None)
+
+
+async def closed_daily(db):
+    """Daily series of every closed month, for all-time reports."""
+
+    docs = await db.closed_months.find(
+        {"status": "closed"}, {"daily": 1}
+    ).to_list(None)
+    return [tuple(d) for doc in docs for d in doc["daily"]]
+
+
+async def _month_rows(db, coll, month):
+    # rows already moved by an interrupted close are in the archive
+    q = {"date": {"$regex": f"^{month}"}}
+    rows = await db[coll].find(q).to_list(None)
+    rows += await db[f"{coll}_archive"].find(q).to_list(None)
+    return sorted(rows, key=lambda d: d.get("date") or "")
+
+
+async def _archive(db, coll, month):
+    """Move a month's hot rows to the archive and return how many were
+    read. A row updated after it was read stays for the next pass, and
+    its copy is dropped if the update moved it to another month."""
+
+    rows = await db[coll].find({"date": {"$regex": f"^{month}"}}).to_list(None)
+    if not rows:
+        return 0
+
+    await db[f"{coll}_archive"].bulk_write(
+        [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in rows],
+        ordered=False,
+    )
+    await db[coll].bulk_write(
+        [DeleteOne({"_id": d["_id"], "seq": d.get("seq")}) for d in rows],
+        ordered=False,
+    )
+
+    left = await db[coll].find(
+        {"_id": {"$in": [d["_id"] for d in rows]}}, {"date": 1}
+    ).to_list(None)
+    moved = [d["_id"] for d in left if not (d.get("date") or "").startswith(month)]
+    if moved:
+        await db[f"{coll}_archive"].delete_many({"_id": {"$in": moved}})
+
+    return len(rows)
+
+
+async def _freeze(db, month):
+    """Write the closed snapshot from the archived rows."""
+
+    revenue = await _month_rows(db, "revenue", month)
+    expenses = await _month_rows(db, "expenses", month)
+
+    snap = MonthSnapshot(month)
+    for r in revenue:
+        snap.put_revenue(r)
+    for e in expenses:
+        snap.put_expense(e)
+
+    strip = lambda rows: [{k: v for k, v in d.items() if k != "_id"} for d in rows]
+
+    await db.closed_months.update_one(
+        {"_id": month},
+        {"$set": {
+            "status": "closed",
+            "totals": snap.totals(),
+            "daily": [list(d) for d in snap.daily()],
+            "category_data": snap.category_breakdown(),
+            "revenue_count": len(revenue),
+            "expense_count": len(expenses),
+            "revenue_rows": _pack(strip(revenue)),
+            "expense_rows": _pack(strip(expenses)),
+        }},
+    )
+
+
+async def close_month(db, month, user_id):
+
+    # status "closing" blocks new writes; a crash part way leaves the
+    # month closing and close_month can be rerun
+    await db.closed_months.update_one(
+        {"_id": month},
+        {"$set": {
+            "status": "closing",
+            "closed_at": datetime.now(timezone.utc).isoformat(),
+            "closed_by": user_id,
+        }},
+        upsert=True,
+    )
+
+    # a write that passed ensure_open before "closing" was set can still
+    # land after the rows were read: sweep until a pass finds nothing,
+    # and again after the snapshot is written, folding late rows in
+    q = {"date": {"$regex": f"^{month}"}}
+    while True:
+        for coll in ("revenue", "expenses"):
+            while await _archive(db, coll, month):
+                pass
+        await _freeze(db, month)
+        if not (await db.revenue.find_one(q, {"_id": 1})
+                or await db.expenses.find_one(q, {"_id": 1})):
+            break
+
+    return await get_closed(db, month)
+
+
+async def reopen_month(db, month):
+
+    if not await db.closed_months.find_one({"_id": month}, {"_id": 1}):
+        return False
+
+    q = {"date": {"$regex": f"^{month}"}}
+
+    for coll in ("revenue", "expenses"):
+        rows = await db[f"{coll}_archive"].find(q).to_list(None)
+        if not rows:
+            continue
+        await db[coll].bulk_write(
+            [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in rows],
+            ordered=False,
+        )
+        await db[f"{coll}_archive"].delete_many(
+            {"_id": {"$in": [d["_id"] for d in rows]}}
+        )
+
+    await db.closed_months.delete_one({"_id": month})
+    return True
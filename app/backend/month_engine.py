@@ -0,0 +1,334 @@
+import calendar
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+# In-process columnar cache of month data. A month of revenue and
+# expenses is loaded once into numpy arrays (day index, category code,
+# amount) and kept in step with writes, so report handlers compute
+# totals, daily series and category breakdowns without touching Mongo.
+# Writes made by other workers are caught by comparing the month's stored
+# revision with the one the snapshot was loaded at before serving it.
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+ENGINE_MAX_MB = float(os.getenv("ENGINE_MAX_MB", "64"))
+ENGINE_TTL = float(os.getenv("ENGINE_TTL", "300"))
+
+
+def _amount(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _rid(doc):
+    return doc.get("id") or str(doc.get("_id"))
+
+
+class Columns:
+    """Growable column store keyed by row id, with O(1) upsert/remove."""
+
+    def __init__(self, capacity=64):
+        self.ids = []
+        self.pos = {}
+        self.day = np.zeros(capacity, dtype=np.int8)
+        self.code = np.zeros(capacity, dtype=np.int16)
+        self.amount = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        arrays = self.day.nbytes + self.code.nbytes + self.amount.nbytes
+        index = sys.getsizeof(self.ids) + sys.getsizeof(self.pos)
+        if self.ids:
+            index += len(self.ids) * sys.getsizeof(self.ids[0])
+        return arrays + index
+
+    def _grow(self):
+        cap = len(self.amount) * 2
+        self.day = np.resize(self.day, cap)
+        self.code = np.resize(self.code, cap)
+        self.amount = np.resize(self.amount, cap)
+
+    def upsert(self, rid, day, code, amount):
+        i = self.pos.get(rid)
+        if i is None:
+            i = len(self.ids)
+            if i == len(self.amount):
+                self._grow()
+            self.ids.append(rid)
+            self.pos[rid] = i
+        self.day[i] = day
+        self.code[i] = code
+        self.amount[i] = amount
+
+    def remove(self, rid):
+        i = self.pos.pop(rid, None)
+        if i is None:
+            return
+        last = len(self.ids) - 1
+        if i != last:
+            moved = self.ids[last]
+            self.ids[i] = moved
+            self.pos[moved] = i
+            self.day[i] = self.day[last]
+            self.code[i] = self.code[last]
+            self.amount[i] = self.amount[last]
+        self.ids.pop()
+
+    def view(self):
+        n = len(self.ids)
+        return self.day[:n], self.code[:n], self.amount[:n]
+
+
+class MonthSnapshot:
+
+    def __init__(self, month):
+        self.month = month
+        year, mon = int(month[:4]), int(month[5:7])
+        self.ndays = calendar.monthrange(year, mon)[1]
+        self.revenue = Columns()
+        self.expenses = Columns()
+        self.categories = []
+        self.category_codes = {}
+        self.loaded_at = time.monotonic()
+        self.rev = None
+
+    @property
+    def nbytes(self):
+        return self.revenue.nbytes + self.expenses.nbytes
+
+    def _day(self, date):
+        if not date or date[:7] != self.month:
+            return None
+        try:
+            day = int(date[8:10]) - 1
+        except ValueError:
+            return None
+        return day if 0 <= day < self.ndays else None
+
+    def _code(self, category):
+        code = self.category_codes.get(category)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(category)
+            self.category_codes[category] = code
+        return code
+
+    # ---------- writes ----------
+
+    def put_revenue(self, doc):
+        day = self._day(doc.get("date"))
+        if day is None:
+            self.revenue.remove(_rid(doc))
+            return
+        self.revenue.upsert(
+            _rid(doc), day, 0, _amount(doc.get("total_revenue"))
+        )
+
+    def put_expense(self, doc):
+        day = self._day(doc.get("date"))
+        if day is None:
+            self.expenses.remove(_rid(doc))
+            return
+        self.expenses.upsert(
+            _rid(doc),
+            day,
+            self._code(doc.get("category")),
+            _amount(doc.get("amount")),
+        )
+
+    # ---------- queries ----------
+
+    def _sums(self, cols, lo=0, hi=None):
+        day, _, amount = cols.view()
+        if hi is None:
+            hi = self.ndays
+        sel = (day >= lo) & (day < hi)
+        return amount[sel].sum() if len(amount) else 0.0
+
+    def totals(self, lo=0, hi=None):
+        tr = float(self._sums(self.revenue, lo, hi))
+        te = float(self._sums(self.expenses, lo, hi))
+        return {
+            "total_revenue": tr,
+            "total_expenses": te,
+            "net_profit": tr - te,
+        }
+
+    def daily(self):
+        """(date, revenue, expenses) for every day that has entries."""
+
+        rday, _, ramt = self.revenue.view()
+        eday, _, eamt = self.expenses.view()
+
+        n = self.ndays
+        rsum = np.bincount(rday, weights=ramt, minlength=n)
+        esum = np.bincount(eday, weights=eamt, minlength=n)
+        seen = (np.bincount(rday, minlength=n) + np.bincount(eday, minlength=n)) > 0
+
+        return [
+            (f"{self.month}-{d + 1:02d}", float(rsum[d]), float(esum[d]))
+            for d in np.flatnonzero(seen)
+        ]
+
+    def category_breakdown(self):
+        _, code, amount = self.expenses.view()
+
+        k = len(self.categories)
+        sums = np.bincount(code, weights=amount, minlength=k)
+        used = np.bincount(code, minlength=k) > 0
+
+        return [
+            {"name": self.categories[c], "value": float(sums[c])}
+            for c in np.flatnonzero(used)
+        ]
+
+
+class MonthEngine:
+
+    def __init__(self, max_bytes=None, ttl=ENGINE_TTL, expand=None, revision=None):
+        self.max_bytes = max_bytes or int(ENGINE_MAX_MB * 1024 * 1024)
+        self.ttl = ttl
+        # async (db, month) -> extra expense rows not stored in expenses
+        self.expand = expand
+        # async (month) -> (month rev, templates rev) as stored in Mongo
+        self.revision = revision
+        self.months = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @staticmethod
+    def valid_month(month):
+        return bool(month and MONTH_RE.match(month))
+
+    async def load(self, db, month):
+        snap = MonthSnapshot(month)
+        q = {"date": {"$regex": f"^{month}"}}
+
+        async for r in db.revenue.find(
+            q, {"id": 1, "date": 1, "total_revenue": 1}
+        ):
+            snap.put_revenue(r)
+
+        async for e in db.expenses.find(
+            q, {"id": 1, "date": 1, "category": 1, "amount": 1}
+        ):
+            snap.put_expense(e)
+
+        if self.expand:
+            for e in await self.expand(db, month):
+                snap.put_expense(e)
+
+        return snap
+
+    async def get(self, db, month):
+        """Snapshot of `month`, cached under its revision. `db` must be the
+        primary: a secondary may not have the writes the revision counts
+        yet, and the stale rows would be cached as current."""
+
+        if not self.valid_month(month):
+            raise ValueError(f"Invalid month: {month!r}")
+
+        rev = await self.revision(month) if self.revision else None
+
+        snap = self.months.get(month)
+        if snap and time.monotonic() - snap.loaded_at < self.ttl:
+            if snap.rev == rev:
+                self.hits += 1
+                self.months.move_to_end(month)
+                return snap
+            self.stale += 1
+
+        self.misses += 1
+        snap = await self.load(db, month)
+        snap.rev = rev
+        self.months[month] = snap
+        self.months.move_to_end(month)
+        self._evict()
+        return snap
+
+    def _evict(self):
+        while len(self.months) > 1 and self.nbytes > self.max_bytes:
+            self.months.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self.months.values())
+
+    # ---------- write hooks ----------
+
+    def _apply(self, before, after, put, remove):
+        for doc in (before, after):
+            if not doc:
+                continue
+            snap = self.months.get((doc.get("date") or "")[:7])
+            if snap:
+                remove(snap, _rid(doc))
+
+        if after:
+            snap = self.months.get((after.get("date") or "")[:7])
+            if snap:
+                put(snap, after)
+        self._evict()
+
+    def revenue_changed(self, before=None, after=None):
+        self._apply(
+            before, after,
+            MonthSnapshot.put_revenue,
+            lambda s, rid: s.revenue.remove(rid),
+        )
+
+    def expense_changed(self, before=None, after=None):
+        self._apply(
+            before, after,
+            MonthSnapshot.put_expense,
+            lambda s, rid: s.expenses.remove(rid),
+        )
+
+    def revised(self, month, rev):
+        """This worker's write moved `month` to revision `rev`. The cached
+        snapshot already has the write; it stays current only if nobody
+        else wrote since it was loaded."""
+
+        snap = self.months.get(month)
+        if snap and snap.rev and snap.rev[0] == rev - 1:
+            snap.rev = (rev, snap.rev[1])
+
+    def invalidate(self, month=None):
+        if month is None:
+            self.months.clear()
+        else:
+            self.months.pop(month, None)
+
+    def stats(self):
+        return {
+            "max_bytes": self.max_bytes,
+            "used_bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "months": [
+                {
+                    "month": m,
+                    "bytes": s.nbytes,
+                    "revenue_rows": len(s.revenue),
+                    "expense_rows": len(s.expenses),
+                    "age_seconds": round(time.monotonic() - s.loaded_at, 1),
+                }
+                for m, s in self.months.items()
+            ],
+        }
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import db_pool
+from month_engine import MonthEngine
+
+
+# Shows where report reads land. Runs report-style reads through the
+# report handle and CRUD-style reads through the primary handle, and prints
+# each replica set member's opcounter deltas.
+#
+# A local single-machine replica set:
+#   for p in 27017 27018 27019; do
+#     mkdir -p /tmp/rs/$p
+#     mongod --replSet rs0 --port $p --dbpath /tmp/rs/$p --fork --logpath /tmp/rs/$p.log
+#   done
+#   mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+#     {_id: 0, host: "localhost:27017"},
+#     {_id: 1, host: "localhost:27018"},
+#     {_id: 2, host: "localhost:27019"}]})'
+#   MONGO_URL="mongodb://localhost:27017/?replicaSet=rs0" python read_routing_check.py
+
+load_dotenv()
+
+
+async def opcounters(hosts):
+    out = {}
+    for host in hosts:
+        c = AsyncIOMotorClient(f"mongodb://{host}/?directConnection=true")
+        status = await c.admin.command("serverStatus")
+        ops = status["opcounters"]
+        out[host] = ops["query"] + ops["getmore"] + ops["command"]
+        c.close()
+    return out
+
+
+async def main(month, iterations):
+    monitor = db_pool.PoolMonitor()
+    client = db_pool.create_client(os.environ["MONGO_URL"], monitor)
+    name = os.environ["DB_NAME"]
+    db = client[name]
+    reports_db = db_pool.report_database(client, name)
+
+    hello = await db.command("hello")
+    if "setName" not in hello:
+        raise SystemExit("MONGO_URL is not a replica set; nothing to route")
+    hosts = hello["hosts"]
+    primary = hello["primary"]
+
+    print(f"replica set {hello['setName']}, primary {primary}")
+    print(f"report read preference: {reports_db.read_preference!r}")
+
+    engine = MonthEngine()
+
+    async def report_reads():
+        await engine.load(reports_db, month)
+        await reports_db.revenue.aggregate([
+            {"$group": {"_id": "$date", "t": {"$sum": "$total_revenue"}}}
+        ]).to_list(None)
+        await reports_db.expenses.aggregate([
+            {"$group": {"_id": "$date", "t": {"$sum": "$amount"}}}
+        ]).to_list(None)
+
+    async def crud_reads():
+        await db.expenses.find({}, {"_id": 0}).sort("date", -1).to_list(1000)
+
+    for label, fn in (("report", report_reads), ("crud", crud_reads)):
+        before = await opcounters(hosts)
+        for _ in range(iterations):
+            await fn()
+        after = await opcounters(hosts)
+
+        print(f"\n{label} reads x{iterations}")
+        for host in hosts:
+            role = "primary" if host == primary else "secondary"
+            print(f"  {host:<22}{role:<11}{after[host] - before[host]:>8} ops")
+
+    print(f"\npool checkouts by server: {monitor.stats()['checkouts_by_server']}")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--month", default="2026-01")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.month, args.iterations))
@@ -0,0 +1,142 @@
+import calendar
+import uuid
+from datetime import datetime, timezone
+
+from export_jobs import month_range
+
+
+# Recurring expense templates (rent, salaries, mess contracts). A template
+# is stored once and expanded into virtual expense rows for whatever months
+# a report asks for. Only occurrences that differ from the template are
+# stored: an override or payment is an ordinary expense carrying
+# template_id/occurrence, and a skipped month is listed on the template.
+# Closing a month materializes its remaining occurrences, so closed
+# snapshots hold real rows and expansion only ever covers open months.
+
+def current_month():
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def occurrence_date(template, month):
+    y, m = int(month[:4]), int(month[5:7])
+    day = min(template["day"], calendar.monthrange(y, m)[1])
+    return f"{month}-{day:02d}"
+
+
+def virtual_id(template_id, month):
+    return f"tpl:{template_id}:{month}"
+
+
+def instance(template, month):
+    return {
+        "id": virtual_id(template["id"], month),
+        "date": occurrence_date(template, month),
+        "category": template["category"],
+        "description": template["description"],
+        "amount": template["amount"],
+        "remarks": template.get("remarks") or "",
+        "created_at": template["created_at"],
+        "template_id": template["id"],
+        "occurrence": month,
+        "virtual": True,
+    }
+
+
+async def ensure_indexes(db):
+    await db.expense_templates.create_index("id", unique=True)
+    await db.expense_templates.create_index([("start", 1), ("end", 1)])
+    await db.expenses.create_index(
+        [("template_id", 1), ("occurrence", 1)], sparse=True
+    )
+
+
+async def active_templates(db, lo, hi, template_id=None):
+    q = {
+        "start": {"$lte": hi},
+        "$or": [{"end": None}, {"end": {"$gte": lo}}],
+    }
+    if template_id:
+        q["id"] = template_id
+    return await db.expense_templates.find(q, {"_id": 0}).to_list(None)
+
+
+async def expand(db, lo, hi, template_id=None):
+    """Virtual expense rows for open months lo..hi (YYYY-MM), oldest first,
+    of every template or just `template_id`.
+
+    Cost is one read of the active templates plus one indexed read of the
+    stored occurrences in range, never a scan of expenses by month.
+    """
+
+    templates = await active_templates(db, lo, hi, template_id)
+    if not templates:
+        return []
+
+    closed = {
+        d["_id"] for d in await db.closed_months.find(
+            {"_id": {"$gte": lo, "$lte": hi}}, {"_id": 1}
+        ).to_list(None)
+    }
+    stored = {
+        (d["template_id"], d["occurrence"])
+        for d in await db.expenses.find(
+            {
+                "template_id": {"$in": [t["id"] for t in templates]},
+                "occurrence": {"$gte": lo, "$lte": hi},
+            },
+            {"_id": 0, "template_id": 1, "occurrence": 1},
+        ).to_list(None)
+    }
+
+    rows = []
+    for t in templates:
+        skip = set(t.get("skip") or [])
+        for month in month_range(max(lo, t["start"]), min(hi, t.get("end") or hi)):
+            if month in closed or month in skip or (t["id"], month) in stored:
+                continue
+            rows.append(instance(t, month))
+
+    return sorted(rows, key=lambda d: d["date"])
+
+
+async def expand_all(db, until=None):
+    """Every virtual row from the first template up to `until` (default:
+    the current month)."""
+
+    first = await db.expense_templates.find_one({}, {"start": 1}, sort=[("start", 1)])
+    if not first:
+        return []
+    hi = until or current_month()
+    return await expand(db, first["start"], hi) if first["start"] <= hi else []
+
+
+async def past(db, template, today=None):
+    """A template's virtual rows dated up to `today` (default: now)."""
+
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    if template["start"] > today[:7]:
+        return []
+    virtual = await expand(db, template["start"], today[:7], template["id"])
+    return [row for row in virtual if row["date"] <= today]
+
+
+def template_doc(data):
+    return {
+        "id": str(uuid.uuid4()),
+        **data,
+        "skip": [],
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def skip(db, template_id, month):
+    result = await db.expense_templates.update_one(
+        {"id": template_id}, {"$addToSet": {"skip": month}}
+    )
+    return result.matched_count > 0
+
+
+async def unskip(db, template_id, month):
+    await db.expense_templates.update_one(
+        {"id": template_id}, {"$pull": {"skip": month}}
+    )
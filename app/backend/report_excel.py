@@ -1,4 +1,5 @@
 from openpyxl import Workbook
+from io import BytesIO
 import os
 
 def build_excel(summary, month):
@@ -28,3 +29,76 @@ def build_excel(summary, month):
     print("Saved report:", file_path)   # ✅ debug line
 
     return file_path
+
+
+REVENUE_HEADER = ["Date", "Cash Amount", "Contribution Total", "Total Revenue"]
+EXPENSE_HEADER = ["Date", "Category", "Description", "Amount", "Remarks"]
+
+
+def revenue_row(r):
+    contrib_total = sum(c.get("amount", 0) for c in r.get("contributions", []))
+
+    return [
+        r.get("date"),
+        r.get("cash_amount", 0),
+        contrib_total,
+        r.get("total_revenue", 0),
+    ]
+
+
+def expense_row(e):
+    return [
+        e.get("date"),
+        e.get("category"),
+        e.get("description"),
+        e.get("amount", 0),
+        e.get("remarks", ""),
+    ]
+
+
+def build_range_workbook(months):
+    """Render a multi-month workbook and return it as xlsx bytes.
+
+    `months` is a list of (month, revenue_rows, expense_rows, summary)
+    tuples. Runs in a worker process, so it only takes plain data.
+    """
+
+    wb = Workbook(write_only=True)
+
+    overview = wb.create_sheet("Overview")
+    overview.append(["Month", "Total Revenue", "Total Expenses", "Net Profit"])
+
+    for month, _, _, summary in months:
+        overview.append([
+            month,
+            summary["total_revenue"],
+            summary["total_expenses"],
+            summary["net_profit"],
+        ])
+
+    for month, revenue, expenses, summary in months:
+
+        ws = wb.create_sheet(f"{month} Summary")
+        ws.append(["Month", month])
+        ws.append([])
+        ws.append(["Total Revenue", summary["total_revenue"]])
+        ws.append(["Total Expenses", summary["total_expenses"]])
+        ws.append(["Net Profit", summary["net_profit"]])
+        ws.append([])
+        ws.append(["Category", "Amount"])
+        for c in summary["category_data"]:
+            ws.append([c["name"], c["value"]])
+
+        ws = wb.create_sheet(f"{month} Revenue")
+        ws.append(REVENUE_HEADER)
+        for r in revenue:
+            ws.append(revenue_row(r))
+
+        ws = wb.create_sheet(f"{month} Expenses")
+        ws.append(EXPENSE_HEADER)
+        for e in expenses:
+            ws.append(expense_row(e))
+
+    stream = BytesIO()
+    wb.save(stream)
+    return stream.getvalue()
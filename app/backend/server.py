@@ -1,7 +1,8 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from pathlib import Path
 from pydantic import BaseModel, ConfigDict
@@ -12,6 +13,8 @@ from bson import ObjectId
 from pymongo import ReturnDocument
 import jwt
 import os
+import asyncio
+import time
 import uuid
 from bson import ObjectId
 from pymongo import ReturnDocument
@@ -22,9 +25,37 @@ from openpyxl import Workbook
 from fastapi.responses import StreamingResponse
 from io import BytesIO
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
-from report_excel import build_excel
+from report_excel import (
+    build_excel,
+    REVENUE_HEADER,
+    EXPENSE_HEADER,
+    revenue_row,
+    expense_row,
+)
 from mailer import send_report
+import contributors
+from month_engine import MonthEngine, MonthSnapshot
+from jobs import JobCoordinator
+import db_pool
+from export_jobs import ExportQueue, month_range
+import month_close
+from singleflight import SingleFlight
+import sync
+from ledger_import import ImportJob
+import budgets
+import balance
+import recurring
+from auth_cache import TokenCache, UserDirectory
+import auth_cache
+import columnar_export
+from starlette.background import BackgroundTask
+from fastapi.responses import FileResponse
+import attachments
+from attachments import Attachments
+from admission import ADMISSION_ENABLED, Admission, AdmissionMiddleware
+import tempfile
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime
 
@@ -44,17 +75,84 @@ SECRET_KEY = os.environ.get(
 
 ALGORITHM = "HS256"
 
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+
+# widest range /reports/range sums, one month snapshot per month
+RANGE_MAX_MONTHS = int(os.getenv("RANGE_MAX_MONTHS", "120"))
+
+# client and db are created per worker by the lifespan hook (see BOOT)
+pool_monitor = db_pool.PoolMonitor()
+client = None
+db = None
+reports_db = None
+
+async def month_revision(month):
+    docs = await db.month_revisions.find(
+        {"_id": {"$in": [month, "templates"]}}
+    ).to_list(None)
+    revs = {d["_id"]: d["rev"] for d in docs}
+    return revs.get(month, 0), revs.get("templates", 0)
+
+
+engine = MonthEngine(
+    expand=lambda db, month: recurring.expand(db, month, month),
+    revision=month_revision,
+)
+coordinator = JobCoordinator(db)
+exports = ExportQueue(db)
+receipts = Attachments(db)
+flight = SingleFlight()
+token_cache = TokenCache()
+users = UserDirectory(db)
 
 # ================= APP =================
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    await startup()
+    yield
+    await shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 @app.api_route("/health",methods=["GET","HEAD"])
 def health():
     return {"status": "ok"}
 
+
+@app.get("/ready")
+async def ready():
+
+    if db is None:
+        return JSONResponse(
+            {"status": "starting", "pool": pool_monitor.stats()}, status_code=503
+        )
+
+    try:
+        latency = await db_pool.ping(db)
+    except Exception as e:
+        return JSONResponse(
+            {"status": "unavailable", "error": str(e), "pool": pool_monitor.stats()},
+            status_code=503,
+        )
+
+    ok = latency <= db_pool.READY_MAX_LATENCY_MS
+
+    return JSONResponse(
+        {
+            "status": "ready" if ok else "degraded",
+            "mongo_latency_ms": round(latency, 2),
+            "pool": pool_monitor.stats(),
+        },
+        status_code=200 if ok else 503,
+    )
+
+# added before CORS so rejections still carry CORS headers
+admission = Admission(SECRET_KEY, ALGORITHM, lookup=token_cache.peek)
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, admission=admission)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -69,6 +167,7 @@ REPORT_RECEIVER = os.getenv("REPORT_RECEIVER")
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 security = HTTPBearer()
 
+# seed for an empty users collection; logins are checked against Mongo
 RAW_USERS = [
     {
         "id": "u1",
@@ -89,11 +188,6 @@ RAW_USERS = [
 ]
 
 
-FIXED_USERS = {
-    u["username"]: {**u, "password": pwd_context.hash(u["password"])}
-    for u in RAW_USERS
-}
-
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -119,71 +213,70 @@ def verify_password(p, h):
 def create_token(uid: str):
     payload = {
         "sub": uid,
+        "jti": uuid.uuid4().hex,
         "exp": datetime.now(timezone.utc) + timedelta(days=7)
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def decode_token(token: str):
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(401, "Token expired")
+    except jwt.PyJWTError:
+        raise HTTPException(401, "Invalid token")
+
+
 async def get_current_user(
     cred: HTTPAuthorizationCredentials = Depends(security),
 ):
-    payload = jwt.decode(
-        cred.credentials,
-        SECRET_KEY,
-        algorithms=[ALGORITHM]
-    )
+    token = cred.credentials
 
-    uid = payload["sub"]
+    user = token_cache.get(token)
+    if user is not None:
+        return user
 
-    for u in FIXED_USERS.values():
-        if u["id"] == uid:
-            return User(id=u["id"], username=u["username"], name=u["name"])
+    payload = decode_token(token)
+    if "sub" not in payload or "exp" not in payload:
+        raise HTTPException(401, "Invalid token")
+    if await auth_cache.is_revoked(db, payload.get("jti")):
+        raise HTTPException(401, "Token revoked")
 
-    raise HTTPException(401, "Invalid user")
+    u = await users.get(payload["sub"])
+    if not u:
+        raise HTTPException(401, "Invalid user")
 
-async def monthly_report_job():
-
-    now = datetime.now()
-    month = now.strftime("%Y-%m")
-
-    match = {"date": {"$regex": f"^{month}"}}
+    user = User(id=u["id"], username=u["username"], name=u["name"])
+    token_cache.put(token, user, payload.get("jti"), payload["exp"])
+    return user
 
-    rev = await db.revenue.aggregate([
-        {"$match": match},
-        {"$group": {"_id": None, "t": {"$sum": "$total_revenue"}}}
-    ]).to_list(1)
+async def monthly_report_job(fire_time=None):
 
-    exp = await db.expenses.aggregate([
-        {"$match": match},
-        {"$group": {"_id": None, "t": {"$sum": "$amount"}}}
-    ]).to_list(1)
+    now = fire_time or datetime.now()
+    month = now.strftime("%Y-%m")
 
-    cat = await db.expenses.aggregate([
-        {"$match": match},
-        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}}
-    ]).to_list(100)
+    snap = await month_snapshot(month)
 
     summary = {
-        "total_revenue": rev[0]["t"] if rev else 0,
-        "total_expenses": exp[0]["t"] if exp else 0,
-        "net_profit": (rev[0]["t"] if rev else 0) - (exp[0]["t"] if exp else 0),
-        "category_data": [{"name": c["_id"], "value": c["total"]} for c in cat]
+        **snap.totals(),
+        "category_data": snap.category_breakdown(),
     }
 
     file_path = build_excel(summary, month)
 
-    # ✅ SEND ONLY TO PREDEFINED USERS
-    for u in FIXED_USERS.values():
-        if u.get("send_report"):     # only flagged users
-            await send_report(u["email"], file_path)
+    # ✅ SEND ONLY TO FLAGGED USERS
+    for u in await users.recipients():
+        await send_report(u["email"], file_path)
 
 
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(data: UserLogin):
 
-    u = FIXED_USERS.get(data.username)
+    u = await users.by_username(data.username)
 
-    if not u or not verify_password(data.password, u["password"]):
+    # pbkdf2 is deliberately slow; keep it off the event loop
+    if not u or not await asyncio.to_thread(verify_password, data.password, u["password"]):
         raise HTTPException(401, "Invalid username or password")
 
     token = create_token(u["id"])
@@ -200,6 +293,34 @@ async def me(user: User = Depends(get_current_user)):
     return user
 
 
+@api_router.post("/auth/logout")
+async def logout(cred: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the presented token until it would have expired."""
+
+    payload = decode_token(cred.credentials)
+    jti = payload.get("jti")
+    if not jti:
+        raise HTTPException(400, "Token cannot be revoked")
+
+    await db.revoked_tokens.update_one(
+        {"jti": jti},
+        {"$setOnInsert": {
+            "jti": jti,
+            "user_id": payload.get("sub"),
+            "expires_at": datetime.fromtimestamp(payload["exp"], timezone.utc),
+        }},
+        upsert=True,
+    )
+    token_cache.revoke(jti=jti)
+
+    return {"message": "logged out"}
+
+
+@api_router.get("/auth/cache")
+async def auth_cache_stats(user=Depends(get_current_user)):
+    return token_cache.stats()
+
+
 # ================= MODELS =================
 
 class Contribution(BaseModel):
@@ -231,6 +352,15 @@ class ExpenseCreate(BaseModel):
     remarks: Optional[str] = ""
 
 
+class Attachment(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    filename: str
+    content_type: str
+    size: int
+    uploaded_at: str
+
+
 class Expense(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -240,25 +370,153 @@ class Expense(BaseModel):
     amount: float
     remarks: str
     created_at: str
+    attachments: List[Attachment] = []
+    template_id: Optional[str] = None
+    occurrence: Optional[str] = None
+    paid: bool = False
+    virtual: bool = False
+
+
+# ================= WRITE HOOKS =================
+
+def _months(*docs):
+    return {d["date"][:7] for d in docs if d and d.get("date")}
+
+
+# month -> when this worker last wrote to it, for read-your-writes
+recent_writes = {}
+
 
+def report_db(*months):
+    """Handle for report reads: secondaries, unless this worker wrote to one
+    of `months` (any month when none are given) within the staleness bound,
+    so a user sees their own change in the report that follows it."""
+
+    window = db_pool.MONGO_REPORT_MAX_STALENESS_S
+    if window < 0:
+        return reports_db
+    cutoff = time.monotonic() - window
+    keys = (*months, "templates") if months else recent_writes.keys()
+    if any(recent_writes.get(m, 0) > cutoff for m in keys):
+        return db
+    return reports_db
+
+
+async def bump_revisions(months):
+    """Bump the revision of each touched month (keys export reuse)."""
+
+    for m in months:
+        recent_writes[m] = time.monotonic()
+        doc = await db.month_revisions.find_one_and_update(
+            {"_id": m}, {"$inc": {"rev": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        engine.revised(m, doc["rev"])
+
+
+async def ensure_open(date):
+    if date and await month_close.is_closed(db, date[:7]):
+        raise HTTPException(409, f"Month {date[:7]} is closed")
+
+
+async def month_rows(coll: str, month: str, source=None):
+    """Rows of one month sorted by date, from the snapshot if closed."""
+
+    source = source if source is not None else report_db(month)
+
+    rows = await month_close.closed_rows(source, month, coll)
+    if rows is not None:
+        return rows
+
+    q = {"date": {"$regex": f"^{month}"}}
+    rows = await source[coll].find(q, {"_id": 0}).sort("date", 1).to_list(None)
+
+    if coll == "expenses":
+        virtual = await recurring.expand(source, month, month)
+        if virtual:
+            rows = sorted(rows + virtual, key=lambda d: d["date"])
+    return rows
+
+
+async def on_revenue_write(before=None, after=None):
+    if before and not after:
+        await sync.tombstone(db, "revenue", [before.get("id")])
+    if before:
+        await contributors.apply_revenue(db, before, -1)
+    if after:
+        await contributors.apply_revenue(db, after)
+    engine.revenue_changed(before, after)
+    await balance.apply(db, "revenue", before, after)
+    await bump_revisions(_months(before, after))
+
+
+async def virtual_spend(category, month):
+    """Recurring spend in a category, as budgets.report adds it."""
+
+    rows = await recurring.expand(db, month, month)
+    return sum(e["amount"] for e in rows if e["category"] == category)
+
+
+async def on_expense_write(before=None, after=None, replaced=None):
+    """`replaced`: the virtual row a newly stored occurrence stands for."""
+
+    if before and not after:
+        await sync.tombstone(db, "expenses", [before.get("id")])
+        await receipts.delete_all(before.get("attachments"))
+        # a deleted occurrence stays deleted rather than reverting to the template
+        if before.get("template_id"):
+            await recurring.skip(db, before["template_id"], before["occurrence"])
+    await budgets.apply_expense(db, before, after, virtual_spend, replaced)
+    await balance.apply(db, "expenses", before, after)
+    engine.expense_changed(before, after)
+    for doc in (before, after):
+        if doc and doc.get("template_id"):
+            # the stored row replaces (or gives way to) the virtual one
+            engine.invalidate(doc["occurrence"])
+    await bump_revisions(_months(before, after))
+
+async def on_bulk_insert(kind, docs, replaced=()):
+    """Hooks for a batch of freshly inserted rows (ledger import, stored
+    occurrences); `replaced` are the virtual rows they stand for."""
+
+    if kind == "revenue":
+        await contributors.apply_many(db, docs)
+    else:
+        await budgets.apply_many(db, docs, virtual_spend, replaced)
+    await balance.apply_many(db, kind, docs)
+
+    months = _months(*docs)
+    for m in months:
+        engine.invalidate(m)
+    await bump_revisions(months)
 
 # ================= REVENUE =================
 
-@api_router.post("/revenue", response_model=Revenue)
-async def create_revenue(data: RevenueCreate, user=Depends(get_current_user)):
+def revenue_doc(data: RevenueCreate, seq: int):
 
     contrib_total = sum(c.amount for c in data.contributions)
 
-    doc = {
+    return {
         "id": str(uuid.uuid4()),
         "date": data.date,
         "cash_amount": data.cash_amount,
         "contributions": [c.model_dump() for c in data.contributions],
         "total_revenue": data.cash_amount + contrib_total,
         "created_at": datetime.now(timezone.utc).isoformat(),
+        "seq": seq,
     }
 
-    await db.revenue.insert_one(doc)
+
+@api_router.post("/revenue", response_model=Revenue)
+async def create_revenue(data: RevenueCreate, user=Depends(get_current_user)):
+
+    await ensure_open(data.date)
+
+    async with sync.reserve(db) as seq:
+        doc = revenue_doc(data, seq)
+        await db.revenue.insert_one(doc)
+
+    await on_revenue_write(after=doc)
     return Revenue(**doc)
 
 
@@ -270,6 +528,8 @@ async def get_revenue(user=Depends(get_current_user)):
 @api_router.put("/revenue/{rid}", response_model=Revenue)
 async def update_revenue(rid: str, data: RevenueCreate, user=Depends(get_current_user)):
 
+    await ensure_open(data.date)
+
     contrib_total = sum(c.amount for c in data.contributions)
 
     update_doc = {
@@ -283,15 +543,21 @@ async def update_revenue(rid: str, data: RevenueCreate, user=Depends(get_current
     if ObjectId.is_valid(rid):
         query["$or"].append({"_id": ObjectId(rid)})
 
-    updated = await db.revenue.find_one_and_update(
-        query,
-        {"$set": update_doc},
-        return_document=ReturnDocument.AFTER
-    )
+    async with sync.reserve(db) as seq:
+        update_doc["seq"] = seq
+        before = await db.revenue.find_one_and_update(
+            query,
+            {"$set": update_doc},
+            return_document=ReturnDocument.BEFORE
+        )
 
-    if not updated:
+    if not before:
         raise HTTPException(404, "Revenue not found")
 
+    updated = {**before, **update_doc}
+
+    await on_revenue_write(before, updated)
+
     updated.pop("_id", None)
     return Revenue(**updated)
 
@@ -304,11 +570,20 @@ async def delete_revenue(rid: str, user=Depends(get_current_user)):
     if ObjectId.is_valid(rid):
         query["$or"].append({"_id": ObjectId(rid)})
 
-    result = await db.revenue.delete_one(query)
+    existing = await db.revenue.find_one(query, {"date": 1})
+    if not existing:
+        raise HTTPException(404, "Revenue not found")
+
+    # a month being closed is archiving its rows; a delete now would be undone
+    await ensure_open(existing.get("date"))
+
+    deleted = await db.revenue.find_one_and_delete(query)
 
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(404, "Revenue not found")
 
+    await on_revenue_write(before=deleted)
+
     return {"message": "deleted"}
 
 # ================= REVENUE EXPORT =================
@@ -316,29 +591,16 @@ async def delete_revenue(rid: str, user=Depends(get_current_user)):
 @api_router.get("/revenue/export")
 async def export_revenue_excel(month: str, user=Depends(get_current_user)):
 
-    q = {"date": {"$regex": f"^{month}"}}
-    rows = await db.revenue.find(q, {"_id": 0}).sort("date", 1).to_list(5000)
+    rows = await month_rows("revenue", month)
 
     wb = Workbook()
     ws = wb.active
     ws.title = "Revenue"
 
-    ws.append([
-        "Date",
-        "Cash Amount",
-        "Contribution Total",
-        "Total Revenue"
-    ])
+    ws.append(REVENUE_HEADER)
 
     for r in rows:
-        contrib_total = sum(c.get("amount", 0) for c in r.get("contributions", []))
-
-        ws.append([
-            r.get("date"),
-            r.get("cash_amount", 0),
-            contrib_total,
-            r.get("total_revenue", 0),
-        ])
+        ws.append(revenue_row(r))
 
     stream = BytesIO()
     wb.save(stream)
@@ -352,12 +614,59 @@ async def export_revenue_excel(month: str, user=Depends(get_current_user)):
         },
     )
 
-# ================= EXPENSES =================
+# ================= CONTRIBUTORS =================
 
-@api_router.post("/expenses", response_model=Expense)
-async def create_expense(data: ExpenseCreate, user=Depends(get_current_user)):
+class ContributorRank(BaseModel):
+    rank: int
+    name: str
+    total: float
+    count: int
+    months: int
+
+
+class ContributorMonth(BaseModel):
+    month: str
+    total: float
+    count: int
+
+
+class ContributorDetail(BaseModel):
+    name: str
+    total: float
+    count: int
+    rank: Optional[int]
+    contributors: int
+    history: List[ContributorMonth]
+
+
+@api_router.get("/contributors", response_model=List[ContributorRank])
+@flight.coalesce("year")
+async def list_contributors(
+    year: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    return await contributors.leaderboard(db, year)
+
+
+@api_router.get("/contributors/{name}", response_model=ContributorDetail)
+@flight.coalesce("name", "year")
+async def get_contributor(
+    name: str,
+    year: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+
+    detail = await contributors.contributor_history(db, name, year)
+
+    if not detail:
+        raise HTTPException(404, "Contributor not found")
 
-    doc = {
+    return detail
+
+# ================= EXPENSES =================
+
+def expense_doc(data: ExpenseCreate, seq: int):
+    return {
         "id": str(uuid.uuid4()),
         "date": data.date,
         "category": data.category,
@@ -365,9 +674,20 @@ async def create_expense(data: ExpenseCreate, user=Depends(get_current_user)):
         "amount": data.amount,
         "remarks": data.remarks or "",
         "created_at": datetime.now(timezone.utc).isoformat(),
+        "seq": seq,
     }
 
-    await db.expenses.insert_one(doc)
+
+@api_router.post("/expenses", response_model=Expense)
+async def create_expense(data: ExpenseCreate, user=Depends(get_current_user)):
+
+    await ensure_open(data.date)
+
+    async with sync.reserve(db) as seq:
+        doc = expense_doc(data, seq)
+        await db.expenses.insert_one(doc)
+
+    await on_expense_write(after=doc)
     return Expense(**doc)
 
 
@@ -379,19 +699,26 @@ async def get_expenses(user=Depends(get_current_user)):
 @api_router.put("/expenses/{eid}", response_model=Expense)
 async def update_expense(eid: str, data: ExpenseCreate, user=Depends(get_current_user)):
 
+    await ensure_open(data.date)
+
     query = {"$or": [{"id": eid}]}
     if ObjectId.is_valid(eid):
         query["$or"].append({"_id": ObjectId(eid)})
 
-    updated = await db.expenses.find_one_and_update(
-        query,
-        {"$set": data.model_dump()},
-        return_document=ReturnDocument.AFTER
-    )
+    async with sync.reserve(db) as seq:
+        update_doc = {**data.model_dump(), "seq": seq}
+        before = await db.expenses.find_one_and_update(
+            query,
+            {"$set": update_doc},
+            return_document=ReturnDocument.BEFORE
+        )
 
-    if not updated:
+    if not before:
         raise HTTPException(404, "Expense not found")
 
+    updated = {**before, **update_doc}
+    await on_expense_write(before, updated)
+
     updated.pop("_id", None)
     return Expense(**updated)
 
@@ -403,11 +730,367 @@ async def delete_expense(eid: str, user=Depends(get_current_user)):
     if ObjectId.is_valid(eid):
         query["$or"].append({"_id": ObjectId(eid)})
 
-    result = await db.expenses.delete_one(query)
+    existing = await db.expenses.find_one(query, {"date": 1})
+    if not existing:
+        raise HTTPException(404, "Expense not found")
+
+    # a month being closed is archiving its rows; a delete now would be undone
+    await ensure_open(existing.get("date"))
+
+    deleted = await db.expenses.find_one_and_delete(query)
+
+    if not deleted:
+        raise HTTPException(404, "Expense not found")
+
+    await on_expense_write(before=deleted)
+
+    return {"message": "deleted"}
+
+# ================= RECURRING EXPENSES =================
+
+class ExpenseTemplateCreate(BaseModel):
+    category: str
+    description: str
+    amount: float
+    remarks: Optional[str] = ""
+    day: int                      # day of month, clamped to the month's end
+    start: str                    # YYYY-MM
+    end: Optional[str] = None     # YYYY-MM, open-ended when None
+
+
+class ExpenseTemplate(ExpenseTemplateCreate):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    skip: List[str] = []
+    created_at: str
+
+
+class OccurrenceUpdate(BaseModel):
+    date: Optional[str] = None
+    amount: Optional[float] = None
+    description: Optional[str] = None
+    remarks: Optional[str] = None
+    paid: bool = True
+
+
+def check_template(data: ExpenseTemplateCreate):
+    if not 1 <= data.day <= 31:
+        raise HTTPException(400, "day must be between 1 and 31")
+    if not engine.valid_month(data.start):
+        raise HTTPException(400, "start must be YYYY-MM")
+    if data.end is not None and (not engine.valid_month(data.end) or data.end < data.start):
+        raise HTTPException(400, "end must be YYYY-MM and not before start")
+    if data.amount <= 0:
+        raise HTTPException(400, "amount must be positive")
+
+
+async def templates_changed():
+    # any open month may expand differently now
+    engine.invalidate()
+    await bump_revisions({"templates"})
+
+
+async def find_template(tid: str):
+    t = await db.expense_templates.find_one({"id": tid}, {"_id": 0})
+    if not t:
+        raise HTTPException(404, "Template not found")
+    return t
+
+
+async def store_occurrences(virtual):
+    """Store virtual rows as ordinary expenses, keeping template_id/occurrence."""
+
+    if not virtual:
+        return
+
+    async with sync.reserve(db, len(virtual)) as last:
+        docs = [
+            {
+                **{k: v for k, v in row.items() if k != "virtual"},
+                "id": str(uuid.uuid4()),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "seq": last - len(virtual) + i + 1,
+            }
+            for i, row in enumerate(virtual)
+        ]
+        await db.expenses.insert_many(docs)
+    await on_bulk_insert("expenses", docs, replaced=virtual)
+
+
+async def materialize_occurrences(month: str):
+    """Store a month's remaining virtual rows, e.g. before it is closed."""
+
+    await store_occurrences(await recurring.expand(db, month, month))
+
+
+async def materialize_past(t):
+    """Store a template's occurrences dated up to today, so editing or
+    deleting it only changes what is still to come."""
+
+    await store_occurrences(await recurring.past(db, t))
 
-    if result.deleted_count == 0:
+
+@api_router.get("/expense-templates", response_model=List[ExpenseTemplate])
+async def list_templates(user=Depends(get_current_user)):
+    return await db.expense_templates.find({}, {"_id": 0}).sort("start", 1).to_list(None)
+
+
+@api_router.post("/expense-templates", response_model=ExpenseTemplate)
+async def create_template(data: ExpenseTemplateCreate, user=Depends(get_current_user)):
+
+    check_template(data)
+
+    doc = recurring.template_doc(data.model_dump())
+    await db.expense_templates.insert_one(dict(doc))
+    await templates_changed()
+
+    return ExpenseTemplate(**doc)
+
+
+@api_router.put("/expense-templates/{tid}", response_model=ExpenseTemplate)
+async def update_template(tid: str, data: ExpenseTemplateCreate, user=Depends(get_current_user)):
+
+    check_template(data)
+
+    await materialize_past(await find_template(tid))
+
+    updated = await db.expense_templates.find_one_and_update(
+        {"id": tid},
+        {"$set": data.model_dump()},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        raise HTTPException(404, "Template not found")
+
+    await templates_changed()
+    return ExpenseTemplate(**updated)
+
+
+@api_router.delete("/expense-templates/{tid}")
+async def delete_template(tid: str, user=Depends(get_current_user)):
+
+    # past occurrences are stored first and stay as ordinary expenses
+    await materialize_past(await find_template(tid))
+
+    result = await db.expense_templates.delete_one({"id": tid})
+    if not result.deleted_count:
+        raise HTTPException(404, "Template not found")
+
+    await templates_changed()
+    return {"message": "deleted"}
+
+
+@api_router.get("/expense-templates/occurrences", response_model=List[Expense])
+async def list_occurrences(month: str, user=Depends(get_current_user)):
+    """Every occurrence due in a month: virtual ones and stored overrides."""
+
+    if not engine.valid_month(month):
+        raise HTTPException(400, "month must be YYYY-MM")
+
+    stored = await db.expenses.find(
+        {"occurrence": month, "template_id": {"$ne": None}}, {"_id": 0}
+    ).to_list(None)
+    rows = stored + await recurring.expand(db, month, month)
+
+    return sorted(rows, key=lambda d: d["date"])
+
+
+@api_router.put("/expense-templates/{tid}/occurrences/{month}", response_model=Expense)
+async def update_occurrence(
+    tid: str,
+    month: str,
+    data: OccurrenceUpdate,
+    user=Depends(get_current_user)
+):
+    """Override or mark paid one occurrence; this stores it as an expense."""
+
+    if not engine.valid_month(month):
+        raise HTTPException(400, "month must be YYYY-MM")
+
+    t = await find_template(tid)
+    await ensure_open(month)
+
+    changes = {k: v for k, v in data.model_dump().items() if v is not None}
+    if changes.get("date", month)[:7] != month:
+        raise HTTPException(400, f"date must be in {month}")
+    if data.paid:
+        changes["paid_at"] = datetime.now(timezone.utc).isoformat()
+
+    existing = await db.expenses.find_one({"template_id": tid, "occurrence": month})
+
+    async with sync.reserve(db) as seq:
+        if existing:
+            update_doc = {**changes, "seq": seq}
+            await db.expenses.update_one({"_id": existing["_id"]}, {"$set": update_doc})
+            before, after = existing, {**existing, **update_doc}
+        else:
+            row = {k: v for k, v in recurring.instance(t, month).items() if k != "virtual"}
+            after = {
+                **row,
+                **changes,
+                "id": str(uuid.uuid4()),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "seq": seq,
+            }
+            await db.expenses.insert_one(after)
+            before = None
+
+    # a first override stands for the virtual row, unless it was skipped
+    replaced = None
+    if not existing and month not in (t.get("skip") or []):
+        replaced = recurring.instance(t, month)
+
+    await recurring.unskip(db, tid, month)
+    await on_expense_write(before, after, replaced)
+
+    after.pop("_id", None)
+    return Expense(**after)
+
+
+@api_router.delete("/expense-templates/{tid}/occurrences/{month}")
+async def skip_occurrence(tid: str, month: str, user=Depends(get_current_user)):
+
+    if not engine.valid_month(month):
+        raise HTTPException(400, "month must be YYYY-MM")
+
+    await find_template(tid)
+    await ensure_open(month)
+
+    stored = await db.expenses.find_one_and_delete({"template_id": tid, "occurrence": month})
+    if stored:
+        # the delete hook records the skip
+        await on_expense_write(before=stored)
+    else:
+        await recurring.skip(db, tid, month)
+        engine.invalidate(month)
+        await bump_revisions({month})
+
+    return {"message": "skipped"}
+
+# ================= ATTACHMENTS =================
+
+def grid_chunks(grid_out):
+    async def chunks():
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+    return chunks()
+
+
+async def find_attachment(eid: str, aid: str):
+    """Expense and attachment metadata, including archived (closed) months."""
+
+    for coll in ("expenses", "expenses_archive"):
+        expense = await db[coll].find_one(
+            {"id": eid, "attachments.id": aid}, {"_id": 0, "date": 1, "attachments": 1}
+        )
+        if expense:
+            meta = next(a for a in expense["attachments"] if a["id"] == aid)
+            return expense, meta
+
+    raise HTTPException(404, "Attachment not found")
+
+
+@api_router.post("/expenses/{eid}/attachments", response_model=Attachment)
+async def upload_attachment(
+    eid: str,
+    file: UploadFile = File(...),
+    user=Depends(get_current_user)
+):
+
+    expense = await db.expenses.find_one({"id": eid}, {"date": 1, "attachments": 1})
+    if not expense:
+        raise HTTPException(404, "Expense not found")
+    await ensure_open(expense["date"])
+
+    if file.content_type not in attachments.CONTENT_TYPES:
+        raise HTTPException(415, f"Unsupported attachment type {file.content_type}")
+    if len(expense.get("attachments") or []) >= attachments.ATTACHMENTS_PER_EXPENSE:
+        raise HTTPException(
+            409, f"An expense can have at most {attachments.ATTACHMENTS_PER_EXPENSE} attachments"
+        )
+
+    try:
+        meta = await receipts.save(file, eid, user.id)
+    except attachments.TooLarge as e:
+        raise HTTPException(413, str(e))
+
+    async with sync.reserve(db) as seq:
+        result = await db.expenses.update_one(
+            {"id": eid},
+            {"$push": {"attachments": meta}, "$set": {"seq": seq}},
+        )
+    if not result.matched_count:
+        # deleted while uploading
+        await receipts.delete(meta)
         raise HTTPException(404, "Expense not found")
 
+    return Attachment(**meta)
+
+
+@api_router.get("/expenses/{eid}/attachments/{aid}")
+async def download_attachment(eid: str, aid: str, user=Depends(get_current_user)):
+
+    _, meta = await find_attachment(eid, aid)
+    grid_out = await receipts.open(meta)
+
+    return StreamingResponse(
+        grid_chunks(grid_out),
+        media_type=meta["content_type"],
+        headers={
+            "Content-Length": str(meta["size"]),
+            "Content-Disposition": attachments.content_disposition(meta["filename"]),
+            # content_type is what the uploader declared
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+
+@api_router.get("/expenses/{eid}/attachments/{aid}/thumbnail")
+async def attachment_thumbnail(
+    eid: str,
+    aid: str,
+    size: int = 256,
+    user=Depends(get_current_user)
+):
+
+    if size not in attachments.THUMBNAIL_SIZES:
+        raise HTTPException(
+            400, f"size must be one of {', '.join(map(str, attachments.THUMBNAIL_SIZES))}"
+        )
+
+    _, meta = await find_attachment(eid, aid)
+    if not meta["content_type"].startswith("image/"):
+        raise HTTPException(415, "Thumbnails are only available for images")
+
+    try:
+        grid_out = await receipts.thumbnail(meta, size)
+    except OSError:
+        raise HTTPException(422, "Attachment is not a readable image")
+
+    return StreamingResponse(
+        grid_chunks(grid_out),
+        media_type="image/jpeg",
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
+@api_router.delete("/expenses/{eid}/attachments/{aid}")
+async def delete_attachment(eid: str, aid: str, user=Depends(get_current_user)):
+
+    expense, meta = await find_attachment(eid, aid)
+    await ensure_open(expense["date"])
+
+    async with sync.reserve(db) as seq:
+        await db.expenses.update_one(
+            {"id": eid},
+            {"$pull": {"attachments": {"id": aid}}, "$set": {"seq": seq}},
+        )
+    await receipts.delete(meta)
+
     return {"message": "deleted"}
 
 # ================= EXPENSE EXPORT =================
@@ -415,29 +1098,16 @@ async def delete_expense(eid: str, user=Depends(get_current_user)):
 @api_router.get("/expenses/export")
 async def export_expenses_excel(month: str, user=Depends(get_current_user)):
 
-    q = {"date": {"$regex": f"^{month}"}}
-    rows = await db.expenses.find(q, {"_id": 0}).sort("date", 1).to_list(5000)
+    rows = await month_rows("expenses", month)
 
     wb = Workbook()
     ws = wb.active
     ws.title = "Expenses"
 
-    ws.append([
-        "Date",
-        "Category",
-        "Description",
-        "Amount",
-        "Remarks"
-    ])
+    ws.append(EXPENSE_HEADER)
 
     for e in rows:
-        ws.append([
-            e.get("date"),
-            e.get("category"),
-            e.get("description"),
-            e.get("amount", 0),
-            e.get("remarks", ""),
-        ])
+        ws.append(expense_row(e))
 
     stream = BytesIO()
     wb.save(stream)
@@ -451,6 +1121,74 @@ async def export_expenses_excel(month: str, user=Depends(get_current_user)):
         },
     )
 
+# ================= COLUMNAR EXPORT =================
+
+async def columnar_args(kind: str, start: str, end: str):
+    if kind not in columnar_export.KINDS:
+        raise HTTPException(400, f"kind must be one of {', '.join(columnar_export.KINDS)}")
+    try:
+        lo = datetime.strptime(start, "%Y-%m-%d")
+        hi = datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(400, "start and end must be YYYY-MM-DD")
+    if hi < lo:
+        raise HTTPException(400, "end must not be before start")
+
+    source = report_db()
+    extra = []
+    if kind == "expenses":
+        extra = [
+            e for e in await recurring.expand(source, start[:7], end[:7])
+            if start <= e["date"] <= end
+        ]
+    return source, extra
+
+
+@api_router.get("/export/parquet")
+async def export_parquet(
+    kind: str,
+    start: str,
+    end: str,
+    user=Depends(get_current_user)
+):
+
+    source, extra = await columnar_args(kind, start, end)
+
+    # the footer is written last, so the file is built on disk first
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await columnar_export.write_parquet(path, source, kind, start, end, extra)
+    except Exception:
+        os.unlink(path)
+        raise
+
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=f"{kind}_{start}_{end}.parquet",
+        background=BackgroundTask(os.unlink, path),
+    )
+
+
+@api_router.get("/export/arrow")
+async def export_arrow(
+    kind: str,
+    start: str,
+    end: str,
+    user=Depends(get_current_user)
+):
+
+    source, extra = await columnar_args(kind, start, end)
+
+    return StreamingResponse(
+        columnar_export.arrow_stream(source, kind, start, end, extra),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={
+            "Content-Disposition": f"attachment; filename={kind}_{start}_{end}.arrows"
+        },
+    )
+
 # ================= REPORTS =================
 
 class DailyReport(BaseModel):
@@ -460,31 +1198,72 @@ class DailyReport(BaseModel):
     net_profit: float
 
 
+async def month_snapshot(month: str):
+    if not engine.valid_month(month):
+        raise HTTPException(400, "month must be YYYY-MM")
+
+    closed = await month_close.get_closed(db, month)
+    if closed:
+        return closed
+
+    # cached under a revision read on the primary, so loaded from it too
+    return await engine.get(db, month)
+
+
 @api_router.get("/reports/daily", response_model=List[DailyReport])
+@flight.coalesce("month")
 async def daily_report(
     month: Optional[str] = None,
     user=Depends(get_current_user)
 ):
 
-    match_stage = []
     if month:
-        match_stage = [{"$match": {"date": {"$regex": f"^{month}"}}}]
+        snap = await month_snapshot(month)
+        return [
+            DailyReport(
+                date=d,
+                total_revenue=r,
+                total_expenses=e,
+                net_profit=r - e,
+            )
+            for d, r, e in reversed(snap.daily())
+        ]
+
+    source = report_db()
 
     # revenue grouped by date
-    rev = await db.revenue.aggregate([
-        *match_stage,
+    rev = await source.revenue.aggregate([
         {"$group": {"_id": "$date", "t": {"$sum": "$total_revenue"}}}
     ]).to_list(1000)
 
     # expenses grouped by date
-    exp = await db.expenses.aggregate([
-        *match_stage,
+    exp = await source.expenses.aggregate([
         {"$group": {"_id": "$date", "t": {"$sum": "$amount"}}}
     ]).to_list(1000)
 
+    return merge_daily(
+        rev,
+        exp,
+        await recurring.expand_all(source),
+        # closed months are no longer in the hot collections
+        await month_close.closed_daily(source),
+    )
+
+
+def merge_daily(rev, exp, virtual=(), closed=()):
+    """Combine per-date revenue/expense sums, virtual recurring rows and
+    closed-month daily series into the all-time daily report, newest first."""
+
     rmap = {r["_id"]: r["t"] for r in rev}
     emap = {e["_id"]: e["t"] for e in exp}
 
+    for e in virtual:
+        emap[e["date"]] = emap.get(e["date"], 0) + e["amount"]
+
+    for d, r, e in closed:
+        rmap[d] = rmap.get(d, 0) + r
+        emap[d] = emap.get(d, 0) + e
+
     dates = sorted(set(rmap) | set(emap), reverse=True)
 
     return [
@@ -510,77 +1289,410 @@ class MonthlySummary(BaseModel):
 
 
 @api_router.get("/reports/monthly-summary", response_model=MonthlySummary)
+@flight.coalesce("month")
 async def monthly_summary(month: str, user=Depends(get_current_user)):
 
-    match = {"date": {"$regex": f"^{month}"}}
+    snap = await month_snapshot(month)
 
-    # ---------- totals ----------
-    rev = await db.revenue.aggregate([
-        {"$match": match},
-        {"$group": {
-            "_id": None,
-            "t": {"$sum": {"$toDouble": "$total_revenue"}}
-        }},
-    ]).to_list(1)
+    return MonthlySummary(
+        **snap.totals(),
+        category_data=snap.category_breakdown(),
+        revenue_data=[
+            {"date": d, "revenue": r, "expenses": e}
+            for d, r, e in snap.daily()
+        ]
+    )
 
-    exp = await db.expenses.aggregate([
-        {"$match": match},
-        {"$group": {
-            "_id": None,
-            "t": {"$sum": {"$toDouble": "$amount"}}
-        }},
-    ]).to_list(1)
 
-    tr = rev[0]["t"] if rev else 0
-    te = exp[0]["t"] if exp else 0
+class RangeSummary(BaseModel):
+    start: str
+    end: str
+    total_revenue: float
+    total_expenses: float
+    net_profit: float
+
 
-    # ---------- category totals ----------
-    cat = await db.expenses.aggregate([
-        {"$match": match},
-        {"$group": {
-            "_id": "$category",
-            "total": {"$sum": {"$toDouble": "$amount"}}
-        }},
-    ]).to_list(100)
-
-    # ---------- daily chart data ----------
-    daily_rev = await db.revenue.aggregate([
-        {"$match": match},
-        {"$group": {
-            "_id": "$date",
-            "revenue": {"$sum": {"$toDouble": "$total_revenue"}}
-        }}
-    ]).to_list(200)
-
-    daily_exp = await db.expenses.aggregate([
-        {"$match": match},
-        {"$group": {
-            "_id": "$date",
-            "expenses": {"$sum": {"$toDouble": "$amount"}}
-        }}
-    ]).to_list(200)
-
-    rev_map = {d["_id"]: d["revenue"] for d in daily_rev}
-    exp_map = {d["_id"]: d["expenses"] for d in daily_exp}
-
-    dates = sorted(set(rev_map) | set(exp_map))
-
-    revenue_data = [
-        {
-            "date": d,
-            "revenue": rev_map.get(d, 0),
-            "expenses": exp_map.get(d, 0)
-        }
-        for d in dates
-    ]
+@api_router.get("/reports/range", response_model=RangeSummary)
+@flight.coalesce("start", "end")
+async def range_summary(start: str, end: str, user=Depends(get_current_user)):
 
-    return MonthlySummary(
+    try:
+        lo = datetime.strptime(start, "%Y-%m-%d").date()
+        hi = datetime.strptime(end, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(400, "start and end must be YYYY-MM-DD")
+
+    if hi < lo:
+        raise HTTPException(400, "end must not be before start")
+
+    months = month_range(lo.strftime("%Y-%m"), hi.strftime("%Y-%m"))
+    if len(months) > RANGE_MAX_MONTHS:
+        raise HTTPException(400, f"range must not exceed {RANGE_MAX_MONTHS} months")
+
+    tr = te = 0.0
+
+    for month in months:
+        snap = await month_snapshot(month)
+        first = lo.day - 1 if month == months[0] else 0
+        last = hi.day if month == months[-1] else None
+
+        t = snap.totals(first, last)
+        tr += t["total_revenue"]
+        te += t["total_expenses"]
+
+    return RangeSummary(
+        start=start,
+        end=end,
         total_revenue=tr,
         total_expenses=te,
         net_profit=tr - te,
-        category_data=[{"name": c["_id"], "value": c["total"]} for c in cat],
-        revenue_data=revenue_data
     )
+
+
+class BalanceDay(BaseModel):
+    date: str
+    revenue: float
+    expenses: float
+    net: float
+    balance: float
+    avg_revenue: float
+    avg_expenses: float
+    avg_net: float
+
+
+class BalanceReport(BaseModel):
+    start: str
+    end: str
+    window: int
+    opening_balance: float
+    closing_balance: float
+    days: List[BalanceDay]
+
+
+@api_router.get("/reports/balance", response_model=BalanceReport)
+@flight.coalesce("start", "end", "window")
+async def balance_report(
+    start: str,
+    end: str,
+    window: int = 7,
+    user=Depends(get_current_user)
+):
+
+    if not 1 <= window <= 90:
+        raise HTTPException(400, "window must be between 1 and 90 days")
+
+    try:
+        # validated before expanding templates up to `end`
+        balance.parse_range(start, end)
+        source = report_db()
+        extra = await recurring.expand_all(source, until=end[:7])
+        return await balance.daily_balance(source, start, end, window, extra)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@api_router.get("/reports/engine")
+async def engine_stats(user=Depends(get_current_user)):
+    return engine.stats()
+
+
+@api_router.get("/admission")
+async def admission_stats(user=Depends(get_current_user)):
+    return admission.stats()
+
+
+@api_router.get("/reports/coalescing")
+async def coalescing_stats(user=Depends(get_current_user)):
+    return flight.stats()
+
+
+# ================= BUDGETS =================
+
+class BudgetSet(BaseModel):
+    category: str
+    month: str
+    amount: float
+    thresholds: Optional[List[float]] = None
+
+
+class BudgetStatus(BaseModel):
+    category: Optional[str]
+    month: str
+    budget: Optional[float]
+    spent: float
+    remaining: Optional[float]
+    percent: Optional[float]
+    over: bool
+
+
+@api_router.get("/budgets", response_model=List[BudgetStatus])
+async def get_budgets(month: str, user=Depends(get_current_user)):
+
+    if not engine.valid_month(month):
+        raise HTTPException(400, "month must be YYYY-MM")
+
+    return await budgets.report(db, month, await recurring.expand(db, month, month))
+
+
+@api_router.put("/budgets", response_model=List[BudgetStatus])
+async def set_budget(data: BudgetSet, user=Depends(get_current_user)):
+
+    if not engine.valid_month(data.month):
+        raise HTTPException(400, "month must be YYYY-MM")
+    if data.amount <= 0:
+        raise HTTPException(400, "amount must be positive")
+
+    await budgets.set_budget(db, data.category, data.month, data.amount, data.thresholds)
+    return await budgets.report(
+        db, data.month, await recurring.expand(db, data.month, data.month)
+    )
+
+
+@api_router.delete("/budgets/{month}/{category}")
+async def delete_budget(month: str, category: str, user=Depends(get_current_user)):
+
+    if not await budgets.delete_budget(db, category, month):
+        raise HTTPException(404, "Budget not found")
+
+    return {"message": "deleted"}
+
+
+@api_router.get("/budgets/alerts")
+async def budget_alerts(month: Optional[str] = None, user=Depends(get_current_user)):
+    return await budgets.alerts(db, month)
+
+# ================= SYNC =================
+
+@api_router.get("/sync")
+async def sync_changes(
+    since: int = 0,
+    kind: Optional[str] = None,
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+
+    if kind and kind not in sync.KINDS:
+        raise HTTPException(400, f"kind must be one of {', '.join(sync.KINDS)}")
+
+    try:
+        return await sync.changes(db, since, (kind,) if kind else sync.KINDS, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+# ================= IMPORT =================
+
+IMPORT_KINDS = {
+    "revenue": (RevenueCreate, revenue_doc),
+    "expenses": (ExpenseCreate, expense_doc),
+}
+
+
+import_tasks = set()
+
+
+def import_job(kind: str):
+    model, build = IMPORT_KINDS[kind]
+
+    @asynccontextmanager
+    async def build_docs(items):
+        async with sync.reserve(db, len(items)) as last:
+            first = last - len(items) + 1
+            yield [build(data, first + i) for i, data in enumerate(items)]
+
+    return ImportJob(
+        db, kind, model, build_docs, on_bulk_insert,
+        lambda month: month_close.is_closed(db, month),
+    )
+
+
+async def _run_import(job, path, filename):
+    try:
+        with open(path, "rb") as fh:
+            await job.run(fh, filename)
+    finally:
+        os.unlink(path)
+
+
+@api_router.post("/import/{kind}")
+async def import_ledger(
+    kind: str,
+    file: UploadFile = File(...),
+    user=Depends(get_current_user)
+):
+
+    if kind not in IMPORT_KINDS:
+        raise HTTPException(400, f"kind must be one of {', '.join(IMPORT_KINDS)}")
+
+    filename = file.filename or "upload.csv"
+    if not filename.lower().endswith((".csv", ".xlsx")):
+        raise HTTPException(400, "Only .csv and .xlsx files can be imported")
+
+    # copy the upload in chunks; the background job reads it after we return
+    suffix = os.path.splitext(filename)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        while chunk := await file.read(1024 * 1024):
+            tmp.write(chunk)
+
+    job = import_job(kind)
+    await job.create(filename, user.id)
+
+    task = asyncio.create_task(_run_import(job, tmp.name, filename))
+    import_tasks.add(task)
+    task.add_done_callback(import_tasks.discard)
+
+    return {"id": job.id, "status": "running"}
+
+
+@api_router.get("/import/jobs/{job_id}")
+async def get_import(job_id: str, user=Depends(get_current_user)):
+
+    job = await db.import_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(404, "Import not found")
+
+    return job
+
+# ================= MONTH CLOSE =================
+
+class ClosedMonthInfo(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    month: str
+    status: str
+    closed_at: str
+    closed_by: str
+    totals: dict
+    revenue_count: int
+    expense_count: int
+
+
+def _closed_info(doc):
+    return ClosedMonthInfo(month=doc["_id"], **doc)
+
+
+@api_router.get("/months/closed", response_model=List[ClosedMonthInfo])
+async def list_closed_months(user=Depends(get_current_user)):
+    return [_closed_info(d) for d in await month_close.list_closed(db)]
+
+
+@api_router.post("/months/{month}/close", response_model=ClosedMonthInfo)
+async def close_month(month: str, user=Depends(get_current_user)):
+
+    if not engine.valid_month(month):
+        raise HTTPException(400, "month must be YYYY-MM")
+    if await month_close.get_closed(db, month):
+        raise HTTPException(409, f"Month {month} is already closed")
+
+    await materialize_occurrences(month)
+    closed = await month_close.close_month(db, month, user.id)
+
+    engine.invalidate(month)
+    await bump_revisions({month})
+
+    # closed rows leave the ledger lists, so sync clients drop them
+    for kind in sync.KINDS:
+        rows = await month_close.closed_rows(db, month, kind)
+        await sync.tombstone(db, kind, [r.get("id") for r in rows])
+
+    return _closed_info(closed.doc)
+
+
+@api_router.post("/months/{month}/reopen")
+async def reopen_month(month: str, user=Depends(get_current_user)):
+
+    if not await month_close.reopen_month(db, month):
+        raise HTTPException(404, "Month is not closed")
+
+    engine.invalidate(month)
+    await bump_revisions({month})
+
+    q = {"date": {"$regex": f"^{month}"}}
+    for kind in sync.KINDS:
+        rows = await db[kind].find(q, {"id": 1}).to_list(None)
+        await sync.stamp(db, kind, [r.get("id") for r in rows])
+
+    return {"message": "reopened"}
+
+# ================= EXPORT JOBS =================
+
+class ExportJobCreate(BaseModel):
+    start: str
+    end: str
+
+
+class ExportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    start: str
+    end: str
+    months: int
+    done_months: int
+    status: str
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+
+
+async def export_month_data(month: str):
+
+    # read on the primary: the file is stored under the revision just read
+    # there, and a lagging secondary would pin stale rows to it
+    revenue = await month_rows("revenue", month, db)
+    expenses = await month_rows("expenses", month, db)
+
+    snap = await month_close.get_closed(db, month)
+    if snap is None:
+        snap = MonthSnapshot(month)
+        for r in revenue:
+            snap.put_revenue(r)
+        for e in expenses:
+            snap.put_expense(e)
+    summary = {**snap.totals(), "category_data": snap.category_breakdown()}
+
+    return revenue, expenses, summary
+
+
+@api_router.post("/exports", response_model=ExportJob)
+async def create_export(data: ExportJobCreate, user=Depends(get_current_user)):
+
+    if not (engine.valid_month(data.start) and engine.valid_month(data.end)):
+        raise HTTPException(400, "start and end must be YYYY-MM")
+
+    try:
+        return await exports.submit(data.start, data.end, user.id, export_month_data)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@api_router.get("/exports/{job_id}", response_model=ExportJob)
+async def get_export(job_id: str, user=Depends(get_current_user)):
+
+    job = await exports.get(job_id)
+    if not job:
+        raise HTTPException(404, "Export not found")
+
+    return job
+
+
+@api_router.get("/exports/{job_id}/download")
+async def download_export(job_id: str, user=Depends(get_current_user)):
+
+    job = await exports.get(job_id)
+    if not job:
+        raise HTTPException(404, "Export not found")
+    if job["status"] != "done":
+        raise HTTPException(409, f"Export is {job['status']}")
+
+    grid_out = await exports.open(job)
+
+    return StreamingResponse(
+        grid_chunks(grid_out),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f"attachment; filename={exports.filename(job)}"
+        },
+    )
+
+
 @api_router.get("/test-mail")
 async def test_mail():
 
@@ -604,17 +1716,24 @@ async def test_mail():
     return {"status": "sent"}
 
 
+@api_router.get("/jobs/runs")
+async def job_runs(job: Optional[str] = None, user=Depends(get_current_user)):
+    return await coordinator.recent_runs(job)
+
+
 scheduler = AsyncIOScheduler()
 
-scheduler.add_job(
+coordinator.register(
+    scheduler,
+    "monthly_report",
     monthly_report_job,
-    "cron",
-    day="last",     # ✅ last day of every month
-    hour=18,        # change time if you want
-    minute=0        # change minute if you want
+    CronTrigger(
+        day="last",     # ✅ last day of every month
+        hour=18,        # change time if you want
+        minute=0        # change minute if you want
+    ),
 )
-
-scheduler.start()
+coordinator.add_catchup(scheduler)
 
 
 
@@ -623,6 +1742,69 @@ scheduler.start()
 app.include_router(api_router)
 
 
-@app.on_event("shutdown")
+def connect():
+    global client, db, reports_db
+
+    client = db_pool.create_client(MONGO_URL, pool_monitor)
+    db = client[DB_NAME]
+    reports_db = db_pool.report_database(client, DB_NAME)
+    coordinator.db = db
+    exports.db = db
+    receipts.db = db
+    users.db = db
+
+
+async def startup():
+    connect()
+
+    # open the pool before the worker reports ready
+    await db_pool.warm_up(db)
+
+    await contributors.ensure_indexes(db)
+    await coordinator.ensure_indexes()
+    await exports.ensure_indexes()
+    await receipts.ensure_indexes()
+    await month_close.ensure_indexes(db)
+    await sync.ensure_indexes(db)
+    await budgets.ensure_indexes(db)
+    await balance.ensure_indexes(db)
+    await recurring.ensure_indexes(db)
+    await users.ensure_indexes()
+    await auth_cache.ensure_revocation_index(db)
+    await sync.prune_tombstones(db)
+
+    await users.seed(RAW_USERS, pwd_context.hash)
+    await users.load()
+
+    # backfill derived totals once for data written before they existed;
+    # one worker rebuilds while the others wait, so no write lands mid-way
+    async def backfill_contributors():
+        if not await db.contributor_totals.find_one({}) \
+                and await db.revenue.find_one({"contributions.0": {"$exists": True}}):
+            await contributors.rebuild(db)
+
+    async def backfill_budgets():
+        if not await db.category_spend.find_one({}) and await db.expenses.find_one({}):
+            await budgets.rebuild(db)
+
+    async def backfill_balance():
+        if not await db.month_totals.find_one({}) and (
+                await db.revenue.find_one({}) or await db.expenses.find_one({})):
+            await balance.rebuild(db)
+
+    await coordinator.once("backfill-contributors", backfill_contributors)
+    await coordinator.once("backfill-budgets", backfill_budgets)
+    await coordinator.once("backfill-balance", backfill_balance)
+
+    # every worker schedules jobs; the lease makes sure each runs once
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+        asyncio.create_task(coordinator.catch_up())
+
+
 async def shutdown():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    exports.shutdown()
+    receipts.shutdown()
     client.close()
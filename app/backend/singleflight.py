@@ -0,0 +1,53 @@
+import asyncio
+import functools
+from collections import defaultdict
+
+
+# Single-flight deduplication: concurrent calls with the same key share one
+# in-flight computation instead of each running its own Mongo aggregations.
+
+class SingleFlight:
+
+    def __init__(self):
+        self.inflight = {}
+        self.calls = defaultdict(int)
+        self.coalesced = defaultdict(int)
+
+    async def do(self, key, fn):
+        name = key[0]
+        self.calls[name] += 1
+
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self.coalesced[name] += 1
+            # shield: one caller disconnecting must not cancel the others
+            return await asyncio.shield(fut)
+
+        fut = asyncio.ensure_future(fn())
+        self.inflight[key] = fut
+        fut.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+        return await asyncio.shield(fut)
+
+    def coalesce(self, *params):
+        """Decorate a handler so calls sharing `params` share one run."""
+
+        def wrap(handler):
+            @functools.wraps(handler)
+            async def inner(*args, **kwargs):
+                key = (handler.__name__,) + tuple(kwargs.get(p) for p in params)
+                return await self.do(key, lambda: handler(*args, **kwargs))
+            return inner
+        return wrap
+
+    def stats(self):
+        return {
+            "in_flight": len(self.inflight),
+            "endpoints": {
+                name: {
+                    "calls": self.calls[name],
+                    "coalesced": self.coalesced[name],
+                }
+                for name in self.calls
+            },
+        }
@@ -0,0 +1,220 @@
+import base64
+import binascii
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+
+# Change tracking for delta sync. Every revenue/expense write stamps the
+# document with the next value of a global update sequence, and deletes
+# leave a tombstone carrying their own sequence. Clients keep the token of
+# their last sync and fetch only documents and tombstones newer than it.
+#
+# A sequence number is reserved before its document is written, so every
+# reservation is announced first with a pending marker holding a floor (the
+# sequence before it). A sync never hands out a token past the floor of a
+# write still in flight; the client refetches a few rows it already has
+# and merges them by id rather than skipping the unwritten one for good.
+#
+# A full reset comes in pages of SYNC_MAX_CHANGES rows per kind, walked in
+# _id order. Every page carries the token taken when the reset began and a
+# cursor for the next page; whatever changes while the client pages is
+# newer than that token and arrives with the delta that follows.
+
+SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", "2000"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+# a marker older than this belongs to a writer that died mid-write
+SYNC_PENDING_SECONDS = int(os.getenv("SYNC_PENDING_SECONDS", "60"))
+
+KINDS = ("revenue", "expenses")
+
+
+async def ensure_indexes(db):
+    for kind in KINDS:
+        await db[kind].create_index("seq", sparse=True)
+    await db.tombstones.create_index("seq")
+    await db.sync_pending.create_index(
+        "at", expireAfterSeconds=SYNC_PENDING_SECONDS * 10
+    )
+
+
+async def current_seq(db):
+    doc = await db.counters.find_one({"_id": "changes"})
+    return doc["seq"] if doc else 0
+
+
+async def next_seq(db, n=1):
+    """Reserve n sequence numbers and return the last one."""
+
+    doc = await db.counters.find_one_and_update(
+        {"_id": "changes"},
+        {"$inc": {"seq": n}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["seq"]
+
+
+@asynccontextmanager
+async def reserve(db, n=1):
+    """Reserve n sequence numbers for a write made inside the block and
+    yield the last one. Until the block exits, changes() stays below it."""
+
+    marker = {
+        "_id": str(uuid.uuid4()),
+        "floor": await current_seq(db),
+        "at": datetime.now(timezone.utc),
+    }
+    await db.sync_pending.insert_one(marker)
+    try:
+        yield await next_seq(db, n)
+    finally:
+        await db.sync_pending.delete_one({"_id": marker["_id"]})
+
+
+async def pending_floor(db):
+    """Lowest floor of the writes in flight, or None."""
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=SYNC_PENDING_SECONDS)
+    doc = await db.sync_pending.find_one(
+        {"at": {"$gte": cutoff}}, sort=[("floor", 1)]
+    )
+    return doc["floor"] if doc else None
+
+
+async def tombstone(db, kind, ids):
+    if not ids:
+        return
+
+    now = datetime.now(timezone.utc)
+
+    async with reserve(db, len(ids)) as last:
+        await db.tombstones.insert_many([
+            {"kind": kind, "id": rid, "seq": last - len(ids) + i + 1, "deleted_at": now}
+            for i, rid in enumerate(ids)
+        ])
+
+
+async def stamp(db, kind, ids):
+    """Give existing documents a fresh sequence so clients refetch them."""
+
+    if not ids:
+        return
+
+    async with reserve(db) as seq:
+        await db[kind].update_many({"id": {"$in": ids}}, {"$set": {"seq": seq}})
+
+
+async def horizon(db):
+    doc = await db.counters.find_one({"_id": "tombstone_horizon"})
+    return doc["seq"] if doc else 0
+
+
+async def prune_tombstones(db, days=SYNC_TOMBSTONE_DAYS):
+    """Drop old tombstones; tokens older than them must resync in full."""
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    newest = await db.tombstones.find_one(
+        {"deleted_at": {"$lt": cutoff}}, sort=[("seq", -1)]
+    )
+    if not newest:
+        return 0
+
+    await db.counters.update_one(
+        {"_id": "tombstone_horizon"},
+        {"$max": {"seq": newest["seq"]}},
+        upsert=True,
+    )
+    result = await db.tombstones.delete_many({"seq": {"$lte": newest["seq"]}})
+    return result.deleted_count
+
+
+def _cursor(token, after):
+    raw = json.dumps({"token": token, "after": after}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _parse_cursor(cursor):
+    try:
+        doc = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        after = {
+            k: ObjectId(v) if v else v
+            for k, v in doc["after"].items() if k in KINDS
+        }
+        return int(doc["token"]), after
+    except (binascii.Error, InvalidId, UnicodeError, ValueError,
+            TypeError, KeyError, AttributeError):
+        raise ValueError("invalid sync cursor")
+
+
+async def _reset_page(db, token, kinds, after=None):
+    """One page of a full reset. `after` maps each kind to the last _id
+    sent (None once the kind is done); no `after` is the first page."""
+
+    out = {"token": token, "reset": after is None, "deleted": []}
+    after = after or {}
+    more = {}
+
+    for kind in kinds:
+        pos = after.get(kind, "")
+        if pos is None:
+            out[kind] = []
+            continue
+
+        q = {"_id": {"$gt": pos}} if pos else {}
+        docs = await db[kind].find(q).sort("_id", 1) \
+            .to_list(SYNC_MAX_CHANGES + 1)
+        full = len(docs) > SYNC_MAX_CHANGES
+        docs = docs[:SYNC_MAX_CHANGES]
+        more[kind] = str(docs[-1]["_id"]) if full else None
+
+        for d in docs:
+            del d["_id"]
+        out[kind] = docs
+
+    out["next"] = _cursor(token, more) if any(more.values()) else None
+    return out
+
+
+async def changes(db, since, kinds=KINDS, cursor=None):
+    """Return the delta after `since`, or a full reset when it can't. A
+    reset is paged: `cursor` is the `next` of the page before."""
+
+    if cursor:
+        token, after = _parse_cursor(cursor)
+        return await _reset_page(db, token, kinds, after)
+
+    # counter, then markers, then data: a reservation at or below `last`
+    # either still has its marker or its row is already readable
+    last = await current_seq(db)
+    floor = await pending_floor(db)
+
+    reset = not since or since < await horizon(db) or since > last
+    token = last if floor is None else min(last, floor)
+    if reset:
+        return await _reset_page(db, token, kinds)
+
+    token = max(token, since)
+    limit = SYNC_MAX_CHANGES + 1
+    out = {"token": token, "reset": False, "next": None}
+
+    for kind in kinds:
+        out[kind] = await db[kind].find({"seq": {"$gt": since}}, {"_id": 0}) \
+            .sort("date", -1).to_list(limit)
+
+    out["deleted"] = await db.tombstones.find(
+        {"seq": {"$gt": since}, "kind": {"$in": list(kinds)}},
+        {"_id": 0, "kind": 1, "id": 1, "seq": 1},
+    ).sort("seq", 1).to_list(limit)
+
+    # too many changes: a full list is cheaper than the delta
+    if any(len(out[k]) > SYNC_MAX_CHANGES for k in (*kinds, "deleted")):
+        return await changes(db, 0, kinds)
+
+    return out
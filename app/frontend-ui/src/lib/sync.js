@@ -0,0 +1,38 @@
+/* Merge a /api/sync delta into a list of ledger rows.
+   Rows and tombstones carry `seq`; a tombstone only removes a row
+   if no newer version of that row came in the same delta. */
+
+export function applyChanges(rows, changed = [], deleted = [], reset = false) {
+  const byId = new Map(reset ? [] : rows.map(r => [r.id, r]));
+
+  for (const r of changed) byId.set(r.id, r);
+
+  for (const t of deleted) {
+    const cur = byId.get(t.id);
+    if (cur && !((cur.seq || 0) > t.seq)) byId.delete(t.id);
+  }
+
+  return [...byId.values()].sort((a, b) => b.date.localeCompare(a.date));
+}
+
+/* Fetch the pages of /api/sync after `since` for one kind: one page for a
+   delta, several for a reset, each continuing from the `next` cursor of
+   the one before. */
+
+export async function fetchPages(get, kind, since) {
+  let { data } = await get({ since, kind });
+  const pages = [data];
+
+  while (data.next) {
+    ({ data } = await get({ kind, cursor: data.next }));
+    pages.push(data);
+  }
+
+  return pages;
+}
+
+export function applyPages(rows, pages, kind) {
+  return pages.reduce(
+    (acc, p) => applyChanges(acc, p[kind], p.deleted, p.reset), rows
+  );
+}
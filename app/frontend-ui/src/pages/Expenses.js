@@ -1,5 +1,6 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
+import { applyPages, fetchPages } from "../lib/sync";
 
 import { Card } from "../components/ui/card";
 import { Button } from "../components/ui/button";
@@ -79,10 +80,16 @@ export default function Expenses() {
 
   useEffect(()=>{ fetchExpenses(); },[]);
 
+  const syncToken = useRef(0);
+
   const fetchExpenses = async ()=>{
     try{
-      const res = await axios.get(`${API}/expenses`);
-      setExpenses(res.data);
+      const pages = await fetchPages(
+        params=>axios.get(`${API}/sync`,{ params }),
+        "expenses",syncToken.current
+      );
+      setExpenses(prev=>applyPages(prev,pages,"expenses"));
+      syncToken.current = pages[pages.length-1].token;
     } catch {
       toast.error("Failed to fetch expenses");
     } finally {
@@ -1,6 +1,7 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import { useAuth } from "../context/AuthContext";
+import { applyPages, fetchPages } from "../lib/sync";
 
 import { Card } from "../components/ui/card";
 import { Button } from "../components/ui/button";
@@ -76,11 +77,17 @@ export default function Revenue() {
     if (token && !authLoading) fetchData();
   }, [token, authLoading]);
 
+  const syncToken = useRef(0);
+
   const fetchData = async () => {
     try {
       setLoading(true);
-      const res = await axios.get(`${API}/revenue`);
-      setRevenues(res.data);
+      const pages = await fetchPages(
+        params => axios.get(`${API}/sync`, { params }),
+        "revenue", syncToken.current
+      );
+      setRevenues(prev => applyPages(prev, pages, "revenue"));
+      syncToken.current = pages[pages.length - 1].token;
     } catch {
       toast.error("Failed to fetch revenue");
     } finally {
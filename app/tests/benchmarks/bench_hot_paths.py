@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import List
+
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import TypeAdapter
+
+import server
+from month_engine import MonthSnapshot
+from report_excel import build_excel, build_range_workbook, expense_row, revenue_row
+
+from .conftest import CATEGORIES, expense_rows, revenue_rows
+
+
+def month_of(rows, month="2026-01"):
+    return [{**r, "date": month + r["date"][7:]} for r in rows]
+
+
+# ---------- spreadsheets ----------
+
+def test_build_excel(benchmark, in_tmp, size):
+    summary = {
+        "total_revenue": 1.0,
+        "total_expenses": 1.0,
+        "net_profit": 0.0,
+        "category_data": [
+            {"name": f"{CATEGORIES[i % len(CATEGORIES)]} {i}", "value": float(i)}
+            for i in range(size // 10)
+        ],
+    }
+    benchmark(build_excel, summary, "2026-01")
+
+
+def test_export_rows(benchmark, size):
+    revenue, expenses = revenue_rows(size), expense_rows(size)
+
+    def rows():
+        return [revenue_row(r) for r in revenue], [expense_row(e) for e in expenses]
+
+    benchmark(rows)
+
+
+def test_build_range_workbook(benchmark, size):
+    snap = MonthSnapshot("2026-01")
+    revenue, expenses = month_of(revenue_rows(size)), month_of(expense_rows(size))
+    for r in revenue:
+        snap.put_revenue(r)
+    for e in expenses:
+        snap.put_expense(e)
+    summary = {**snap.totals(), "category_data": snap.category_breakdown()}
+
+    benchmark(build_range_workbook, [("2026-01", revenue, expenses, summary)])
+
+
+# ---------- reports ----------
+
+def test_merge_daily(benchmark, size):
+    revenue, expenses = revenue_rows(size), expense_rows(size, seed=3)
+    rev, exp = {}, {}
+    for r in revenue:
+        rev[r["date"]] = rev.get(r["date"], 0) + r["total_revenue"]
+    for e in expenses:
+        exp[e["date"]] = exp.get(e["date"], 0) + e["amount"]
+    rev = [{"_id": d, "t": t} for d, t in rev.items()]
+    exp = [{"_id": d, "t": t} for d, t in exp.items()]
+    closed = [(e["date"], 1.0, 2.0) for e in expense_rows(size // 10, seed=4)]
+
+    benchmark(server.merge_daily, rev, exp, (), closed)
+
+
+def test_month_snapshot(benchmark, size):
+    revenue, expenses = month_of(revenue_rows(size)), month_of(expense_rows(size))
+
+    def summary():
+        snap = MonthSnapshot("2026-01")
+        for r in revenue:
+            snap.put_revenue(r)
+        for e in expenses:
+            snap.put_expense(e)
+        return snap.totals(), snap.category_breakdown(), snap.daily()
+
+    benchmark(summary)
+
+
+# ---------- validation ----------
+
+def test_validate_revenue(benchmark, size):
+    rows = revenue_rows(size)
+    benchmark(TypeAdapter(List[server.Revenue]).validate_python, rows)
+
+
+def test_validate_expenses(benchmark, size):
+    rows = expense_rows(size)
+    benchmark(TypeAdapter(List[server.Expense]).validate_python, rows)
+
+
+# ---------- auth ----------
+
+def test_create_token(benchmark):
+    benchmark(server.create_token, "u1")
+
+
+def test_get_current_user_miss(benchmark, memory_db):
+    # a token-cache miss: verify the JWT, check revocation, look the user
+    # up. Revocation reads an in-memory mongomock db, so this times the
+    # CPU side of the path, not a Mongo round trip.
+    token = server.create_token("u1")
+    u = {"id": "u1", "username": "u1", "name": "U1"}
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(memory_db.users.insert_one(dict(u)))
+    server.users.put(u)
+    cred = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    async def many():
+        for _ in range(1000):
+            server.token_cache.entries.pop(token, None)
+            await server.get_current_user(cred)
+
+    # per call cost is the reported time / 1000
+    benchmark(lambda: loop.run_until_complete(many()))
+    loop.close()
+
+
+def test_get_current_user_cached(benchmark):
+    token = server.create_token("u1")
+    user = server.User(id="u1", username="u1", name="U1")
+    server.token_cache.put(token, user, None, time.time() + 3600)
+    cred = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    loop = asyncio.new_event_loop()
+
+    async def many():
+        for _ in range(1000):
+            await server.get_current_user(cred)
+
+    # per call cost is the reported time / 1000
+    benchmark(lambda: loop.run_until_complete(many()))
+    loop.close()
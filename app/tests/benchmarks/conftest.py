@@ -0,0 +1,154 @@
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[2] / "backend"
+sys.path.insert(0, str(BACKEND))
+
+# server reads these at import; the benchmarks never connect
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+for key, value in (("MAIL_FROM", "bench@example.com"), ("MAIL_SERVER", "localhost"),
+                   ("MAIL_USERNAME", "bench"), ("MAIL_PASSWORD", "bench")):
+    os.environ.setdefault(key, value)
+
+SIZES = [100, 1_000, 10_000]
+
+CATEGORIES = ["Mess", "Veg", "Rent", "Salary", "Gas", "Milk", "Repairs", "Misc"]
+NAMES = [f"Member {i}" for i in range(40)]
+
+
+def dates(n, rng):
+    return [
+        f"{2020 + rng.randrange(6)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+        for _ in range(n)
+    ]
+
+
+def revenue_rows(n, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i, d in enumerate(dates(n, rng)):
+        contributions = [
+            {"name": rng.choice(NAMES), "amount": float(rng.randrange(50, 500))}
+            for _ in range(rng.randrange(0, 6))
+        ]
+        cash = float(rng.randrange(0, 2000))
+        total = sum(c["amount"] for c in contributions)
+        rows.append({
+            "id": f"r{i}",
+            "date": d,
+            "cash_amount": cash,
+            "contributions": contributions,
+            "contribution_total": total,
+            "total_revenue": cash + total,
+            "created_at": "2026-01-01T00:00:00+00:00",
+        })
+    return rows
+
+
+def expense_rows(n, seed=2):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"e{i}",
+            "date": d,
+            "category": rng.choice(CATEGORIES),
+            "description": "synthetic",
+            "amount": float(rng.randrange(10, 5000)),
+            "remarks": "",
+            "created_at": "2026-01-01T00:00:00+00:00",
+        }
+        for i, d in enumerate(dates(n, rng))
+    ]
+
+
+# allowed slowdown of the min time against the compared run, per benchmark
+# function; the microsecond-scale auth and row cases are noisier than the
+# millisecond ones, so they get more room
+DEFAULT_THRESHOLD = 20
+THRESHOLDS = {
+    "test_create_token": 50,
+    "test_get_current_user_cached": 30,
+    "test_get_current_user_miss": 30,
+    "test_export_rows": 30,
+}
+
+
+class GroupRegressionCheck:
+    """--benchmark-compare-fail with a threshold per benchmark function."""
+
+    field = "min"
+
+    def fails(self, current, compared):
+        group = compared["name"].split("[")[0]
+        threshold = THRESHOLDS.get(group, DEFAULT_THRESHOLD)
+        if not compared[self.field]:
+            return None
+        change = current[self.field] / compared[self.field] * 100 - 100
+        if change > threshold:
+            return f"{self.field} is {change:.1f}% slower (allowed {threshold}%)"
+        return None
+
+
+def pytest_configure(config):
+    # a relative storage path would follow the working directory
+    url = config.option.benchmark_storage
+    if "://" not in url:
+        url = f"file://{url}"
+    storage = None
+    if url.startswith("file://"):
+        storage = Path(config.rootpath) / url[len("file://"):]
+        config.option.benchmark_storage = f"file://{storage}"
+
+    # nothing to compare against on the first run in a checkout
+    saved = storage is None or any(storage.rglob("*.json"))
+    checks = [GroupRegressionCheck()] if saved else None
+    if checks is None:
+        config.option.benchmark_compare = False
+    config.option.benchmark_compare_fail = checks
+    session = getattr(config, "_benchmarksession", None)
+    if session is not None:
+        session.compare = config.option.benchmark_compare
+        session.compare_fail = checks
+
+
+@pytest.hookimpl(hookwrapper=True, tryfirst=True)
+def pytest_sessionfinish(session):
+    # autosave only a run that passed the check, so a slow run never
+    # becomes the baseline the next one is compared with
+    bench = getattr(session.config, "_benchmarksession", None)
+    autosave = bench.autosave if bench else None
+    if autosave:
+        bench.autosave = None
+    yield
+    if autosave and not bench.performance_regressions:
+        bench.autosave = autosave
+        bench.handle_saving()
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"n={n}")
+def size(request):
+    return request.param
+
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    db = AsyncMongoMockClient()["bench"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.users, "db", db)
+    return db
+
+
+@pytest.fixture
+def in_tmp(tmp_path, monkeypatch):
+    # build_excel writes into ./reports
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
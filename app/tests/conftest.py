@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# backend modules are flat, imported the way server.py imports them
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
@@ -0,0 +1,22 @@
+import pytest
+
+from admission import Admission
+
+
+@pytest.mark.parametrize("path,query,name", [
+    ("/api/reports/daily", b"month=2026-01", "light"),
+    ("/api/reports/daily", b"x=1&month=2026-01", "light"),
+    # no month, or an empty one, is the all-time aggregation
+    ("/api/reports/daily", b"", "heavy"),
+    ("/api/reports/daily", b"month=", "heavy"),
+    ("/api/reports/daily", b"month=&x=1", "heavy"),
+    ("/api/reports/balance", b"start=2026-01-01&end=2026-02-01", "heavy"),
+    ("/api/auth/login", b"", "auth"),
+    ("/api/revenue", b"", "light"),
+])
+def test_classify(path, query, name):
+    assert Admission("secret", "HS256").classify(path, query).name == name
+
+
+def test_non_api_paths_are_not_classed():
+    assert Admission("secret", "HS256").classify("/health") is None
@@ -0,0 +1,28 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from auth_cache import UserDirectory
+
+
+def test_seed_hashes_only_missing_users():
+    hashed = []
+
+    def hash_password(p):
+        hashed.append(p)
+        return f"hash:{p}"
+
+    async def go():
+        users = UserDirectory(AsyncMongoMockClient()["auth_test"])
+        seed = [
+            {"id": "1", "username": "a", "password": "pa"},
+            {"id": "2", "username": "b", "password": "pb"},
+        ]
+        await users.seed(seed[:1], hash_password)
+        await users.db.users.update_one({"id": "1"}, {"$set": {"password": "changed"}})
+        await users.seed(seed, hash_password)
+        return await users.db.users.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+
+    rows = asyncio.run(go())
+    assert hashed == ["pa", "pb"]
+    assert [r["password"] for r in rows] == ["changed", "hash:pb"]
@@ -0,0 +1,55 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import budgets
+
+
+def expense(amount, category="Rent", date="2026-02-05", **kw):
+    return {"id": "e", "date": date, "category": category, "amount": amount, **kw}
+
+
+def run_with_budget(steps, recurring=0.0):
+    """Run `steps(db, virtual)` against a 1000 Rent budget for 2026-02 with
+    `recurring` spend kept outside the counters; return the alert thresholds
+    and the reported spend."""
+
+    async def virtual(category, month):
+        return recurring if (category, month) == ("Rent", "2026-02") else 0.0
+
+    async def go():
+        db = AsyncMongoMockClient()["budgets_test"]
+        await budgets.set_budget(db, "Rent", "2026-02", 1000)
+        alerts = await steps(db, virtual)
+        extra = [expense(recurring)] if recurring else []
+        report = await budgets.report(db, "2026-02", extra)
+        return [a["threshold"] for a in alerts], report[0]["spent"]
+
+    return asyncio.run(go())
+
+
+def test_thresholds_count_recurring_spend_like_the_report():
+    async def steps(db, virtual):
+        return await budgets.apply_expense(db, after=expense(150), virtual=virtual)
+
+    # 900 recurring is already past 80%; the 150 crosses 100%, as reported
+    assert run_with_budget(steps, recurring=900.0) == ([1.0], 1050.0)
+    assert run_with_budget(steps) == ([], 150.0)
+
+
+def test_stored_occurrence_only_alerts_on_what_it_adds():
+    async def steps(db, virtual):
+        # the override of a 700 virtual row is 850: spend grows by 150
+        return await budgets.apply_expense(
+            db, after=expense(850), virtual=virtual, replaced=expense(700)
+        )
+
+    assert run_with_budget(steps, recurring=0.0) == ([0.8], 850.0)
+
+
+def test_materialized_occurrences_raise_no_alert():
+    async def steps(db, virtual):
+        rows = [expense(900, template_id="t", occurrence="2026-02")]
+        return await budgets.apply_many(db, rows, virtual, replaced=rows)
+
+    assert run_with_budget(steps) == ([], 900.0)
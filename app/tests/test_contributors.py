@@ -0,0 +1,42 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import contributors
+
+
+def doc(date, **people):
+    return {
+        "date": date,
+        "contributions": [{"name": n, "amount": a} for n, a in people.items()],
+    }
+
+
+async def totals(db):
+    rows = await db.contributor_totals.find({}, {"_id": 0}).to_list(None)
+    return {(r["name"], r["month"]): (r["total"], r["count"]) for r in rows}
+
+
+def test_apply_many_merges_a_batch_per_name_and_month():
+    async def go():
+        db = AsyncMongoMockClient()["contributors_test"]
+        docs = [
+            doc("2026-01-05", asha=50, ravi=20),
+            doc("2026-01-20", asha=30),
+            doc("2026-02-01", asha=10),
+            {"date": "2026-02-02", "contributions": [{"name": "", "amount": 99}]},
+        ]
+        await contributors.apply_many(db, docs)
+        added = await totals(db)
+
+        await contributors.apply_revenue(db, docs[1], sign=-1)
+        await contributors.apply_many(db, [docs[0], docs[2]], sign=-1)
+        return added, await totals(db)
+
+    added, removed = asyncio.run(go())
+    assert added == {
+        ("asha", "2026-01"): (80, 2),
+        ("ravi", "2026-01"): (20, 1),
+        ("asha", "2026-02"): (10, 1),
+    }
+    assert removed == {}
@@ -0,0 +1,102 @@
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from ledger_import import ImportJob, revenue_totals
+
+
+# the shapes server.py validates imported rows with
+class Contribution(BaseModel):
+    name: str
+    amount: float
+
+
+class RevenueCreate(BaseModel):
+    date: str
+    cash_amount: float = 0
+    contributions: List[Contribution] = []
+
+
+class ExpenseCreate(BaseModel):
+    date: str
+    category: str
+    description: str
+    amount: float
+    remarks: str = ""
+
+
+def revenue(cash=100, **people):
+    return RevenueCreate(
+        date="2026-01-05",
+        cash_amount=cash,
+        contributions=[{"name": n, "amount": a} for n, a in people.items()],
+    )
+
+
+def job(kind="revenue"):
+    model = RevenueCreate if kind == "revenue" else ExpenseCreate
+    return ImportJob(None, kind, model, None, None, None)
+
+
+def test_revenue_totals_without_total_columns():
+    data, error = revenue_totals(revenue(asha=50), {})
+    assert error is None
+    assert [c.name for c in data.contributions] == ["asha"]
+
+
+def test_contribution_total_above_named_becomes_unnamed():
+    data, error = revenue_totals(
+        revenue(asha=50), {"contribution_total": "80", "total_revenue": "180"}
+    )
+    assert error is None
+    assert [(c.name, c.amount) for c in data.contributions] == [("asha", 50), ("", 30)]
+
+
+@pytest.mark.parametrize("values,message", [
+    ({"contribution_total": "40"}, "is less than the contributions"),
+    ({"contribution_total": "lots"}, "contribution_total: not a number"),
+    ({"total_revenue": "151"}, "does not match cash + contributions"),
+    ({"total_revenue": "n/a"}, "total_revenue: not a number"),
+])
+def test_revenue_totals_errors(values, message):
+    _, error = revenue_totals(revenue(asha=50), values)
+    assert message in error
+
+
+def test_matching_totals_are_accepted():
+    _, error = revenue_totals(
+        revenue(asha=50), {"contribution_total": "50.001", "total_revenue": "150"}
+    )
+    assert error is None
+
+
+def test_validate_wide_revenue_row():
+    j = job()
+    data = j._validate(2, {
+        "date": "2026-01-05", "cash_amount": "10", "asha": "5", "ravi": "",
+        "contribution_total": "5", "total_revenue": "15",
+    })
+    assert data.cash_amount == 10
+    assert [(c.name, c.amount) for c in data.contributions] == [("asha", 5)]
+    assert j.failed == 0
+
+
+def test_validate_records_row_errors():
+    j = job()
+    assert j._validate(2, {"date": "05/01/2026", "cash_amount": "10"}) is None
+    assert j._validate(3, {"date": "2026-01-05", "cash_amount": "x"}) is None
+    assert j._validate(4, {"date": "2026-01-05", "asha": "5", "total_revenue": "9"}) is None
+
+    assert j.failed == 3
+    assert [e["row"] for e in j.errors] == [2, 3, 4]
+    assert j.errors[0]["error"].startswith("date: expected YYYY-MM-DD")
+    assert j.errors[1]["error"].startswith("cash_amount:")
+
+
+def test_validate_expense_defaults_remarks():
+    j = job("expenses")
+    data = j._validate(2, {
+        "date": "2026-01-05", "category": "Mess", "description": "rice", "amount": "12",
+    })
+    assert data.remarks == "" and data.amount == 12
@@ -0,0 +1,54 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+import month_close
+
+
+def expense(eid, date, amount, seq=1):
+    return {"id": eid, "date": date, "category": "Mess", "amount": amount, "seq": seq}
+
+
+def close_with_late_writes(monkeypatch, hook, late):
+    """close_month with `late` inserted into expenses right after the
+    first call of month_close.<hook>."""
+
+    original = getattr(month_close, hook)
+    pending = list(late)
+
+    async def wrapped(db, *args):
+        result = await original(db, *args)
+        while pending:
+            await db.expenses.insert_one(pending.pop(0))
+        return result
+
+    monkeypatch.setattr(month_close, hook, wrapped)
+
+    async def go():
+        db = AsyncMongoMockClient()["close_test"]
+        await db.expenses.insert_one(expense("e1", "2026-02-01", 30))
+        await db.expenses.insert_one(expense("e9", "2026-03-01", 99))
+        closed = await month_close.close_month(db, "2026-02", "u1")
+        rows = await month_close.closed_rows(db, "2026-02", "expenses")
+        hot = await db.expenses.find({}, {"_id": 0, "id": 1}).to_list(None)
+        return closed, rows, hot
+
+    return asyncio.run(go())
+
+
+def test_rows_written_during_the_sweep_are_archived(monkeypatch):
+    closed, rows, hot = close_with_late_writes(
+        monkeypatch, "_archive", [expense("e2", "2026-02-02", 5)]
+    )
+    assert closed.totals()["total_expenses"] == 35.0
+    assert sorted(r["id"] for r in rows) == ["e1", "e2"]
+    assert hot == [{"id": "e9"}]
+
+
+def test_rows_written_after_the_snapshot_are_folded_in(monkeypatch):
+    closed, rows, hot = close_with_late_writes(
+        monkeypatch, "_freeze", [expense("e3", "2026-02-03", 7)]
+    )
+    assert closed.totals()["total_expenses"] == 37.0
+    assert closed.doc["expense_count"] == 2
+    assert hot == [{"id": "e9"}]
@@ -0,0 +1,118 @@
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from month_engine import Columns, MonthEngine, MonthSnapshot
+
+
+def test_columns_upsert_and_update_in_place():
+    cols = Columns(capacity=2)
+    cols.upsert("a", 0, 1, 10.0)
+    cols.upsert("b", 1, 2, 20.0)
+    cols.upsert("c", 2, 3, 30.0)      # grows past the initial capacity
+    cols.upsert("a", 5, 1, 15.0)
+
+    day, code, amount = cols.view()
+    assert len(cols) == 3
+    assert cols.ids == ["a", "b", "c"]
+    assert list(day) == [5, 1, 2]
+    assert list(code) == [1, 2, 3]
+    assert list(amount) == [15.0, 20.0, 30.0]
+
+
+def test_columns_remove_swaps_last_row_into_the_hole():
+    cols = Columns()
+    for i, rid in enumerate("abcd"):
+        cols.upsert(rid, i, i, float(i))
+
+    cols.remove("b")
+    assert cols.ids == ["a", "d", "c"]
+    assert cols.pos == {"a": 0, "d": 1, "c": 2}
+    assert list(cols.view()[2]) == [0.0, 3.0, 2.0]
+
+    cols.remove("c")                  # the last row: nothing to move
+    cols.remove("missing")
+    assert cols.ids == ["a", "d"]
+    assert list(cols.view()[0]) == [0, 3]
+
+    cols.upsert("d", 9, 0, 9.0)       # a moved row is still found by id
+    assert list(cols.view()[2]) == [0.0, 9.0]
+
+
+def snapshot():
+    snap = MonthSnapshot("2026-02")
+    snap.put_revenue({"id": "r1", "date": "2026-02-01", "total_revenue": 100})
+    snap.put_revenue({"id": "r2", "date": "2026-02-28", "total_revenue": 50})
+    snap.put_expense({"id": "e1", "date": "2026-02-01", "category": "Mess", "amount": 30})
+    snap.put_expense({"id": "e2", "date": "2026-02-14", "category": "Gas", "amount": 12})
+    snap.put_expense({"id": "e3", "date": "2026-02-28", "category": "Mess", "amount": 8})
+    return snap
+
+
+def test_totals_day_bounds():
+    snap = snapshot()
+
+    assert snap.totals() == {
+        "total_revenue": 150.0, "total_expenses": 50.0, "net_profit": 100.0,
+    }
+    # lo inclusive, hi exclusive, both 0-based day indexes
+    assert snap.totals(0, 1)["total_expenses"] == 30.0
+    assert snap.totals(1, 13)["total_expenses"] == 0.0
+    assert snap.totals(13, 14)["total_expenses"] == 12.0
+    assert snap.totals(27)["total_revenue"] == 50.0
+    assert snap.totals(0, 27)["total_revenue"] == 100.0
+    assert snap.totals(28)["total_revenue"] == 0.0
+
+
+def test_snapshot_moves_and_drops_rows():
+    snap = snapshot()
+
+    # moved to another month: gone from this one
+    snap.put_expense({"id": "e2", "date": "2026-03-01", "category": "Gas", "amount": 12})
+    snap.put_expense({"id": "e3", "date": "2026-02-27", "category": "Veg", "amount": 8})
+    snap.put_expense({"id": "e4", "date": "2026-02-30", "category": "Mess", "amount": 1})
+
+    assert snap.daily() == [
+        ("2026-02-01", 100.0, 30.0),
+        ("2026-02-27", 0.0, 8.0),
+        ("2026-02-28", 50.0, 0.0),
+    ]
+    assert snap.category_breakdown() == [
+        {"name": "Mess", "value": 30.0},
+        {"name": "Veg", "value": 8.0},
+    ]
+
+
+def test_engine_reloads_a_month_changed_elsewhere():
+    async def go():
+        db = AsyncMongoMockClient()["engine_test"]
+        revs = {"2026-02": 0}
+
+        async def revision(month):
+            return revs[month], 0
+
+        engine = MonthEngine(revision=revision)
+        await db.expenses.insert_one(
+            {"id": "e1", "date": "2026-02-01", "category": "Mess", "amount": 30}
+        )
+        first = (await engine.get(db, "2026-02")).totals()["total_expenses"]
+
+        # this worker's own write is applied in place and keeps the cache
+        doc = {"id": "e2", "date": "2026-02-02", "category": "Mess", "amount": 5}
+        await db.expenses.insert_one(dict(doc))
+        engine.expense_changed(after=doc)
+        revs["2026-02"] = 1
+        engine.revised("2026-02", 1)
+        own = (await engine.get(db, "2026-02")).totals()["total_expenses"]
+
+        # another worker's write only shows up as a new revision
+        await db.expenses.insert_one(
+            {"id": "e3", "date": "2026-02-03", "category": "Mess", "amount": 7}
+        )
+        revs["2026-02"] = 2
+        other = (await engine.get(db, "2026-02")).totals()["total_expenses"]
+        return first, own, other, engine.stats()
+
+    first, own, other, stats = asyncio.run(go())
+    assert (first, own, other) == (30.0, 35.0, 42.0)
+    assert (stats["hits"], stats["misses"], stats["stale"]) == (1, 2, 1)
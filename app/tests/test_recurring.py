@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import balance
+import recurring
+from export_jobs import month_range
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def new_db():
+    return AsyncMongoMockClient()["recurring_test"]
+
+
+def template(**kw):
+    return {
+        **recurring.template_doc({
+            "category": "Rent", "description": "Building rent", "amount": 100.0,
+            "day": 31, "start": "2026-01", "end": None,
+        }),
+        **kw,
+    }
+
+
+def test_expand_skips_closed_skipped_and_stored_months():
+    async def go():
+        db = new_db()
+        t = template(id="rent")
+        await db.expense_templates.insert_one(dict(t))
+        await db.closed_months.insert_one({"_id": "2026-01"})
+        await recurring.skip(db, "rent", "2026-03")
+        await db.expenses.insert_one(
+            {"id": "x", "date": "2026-04-30", "template_id": "rent", "occurrence": "2026-04"}
+        )
+        return await recurring.expand(db, "2026-01", "2026-05")
+
+    rows = run(go())
+    # day 31 is clamped to the end of short months
+    assert [r["date"] for r in rows] == ["2026-02-28", "2026-05-31"]
+    assert rows[0]["id"] == recurring.virtual_id("rent", "2026-02")
+    assert all(r["virtual"] and r["template_id"] == "rent" for r in rows)
+
+
+def test_expand_stops_at_the_template_end():
+    async def go():
+        db = new_db()
+        await db.expense_templates.insert_one(dict(template(id="a", end="2026-02")))
+        await db.expense_templates.insert_one(dict(template(id="b", start="2026-02", day=5)))
+        return await recurring.expand(db, "2026-01", "2026-03", "a")
+
+    assert [r["occurrence"] for r in run(go())] == ["2026-01", "2026-02"]
+
+
+def test_past_keeps_occurrences_up_to_today():
+    async def go():
+        db = new_db()
+        t = template(id="rent", day=10)
+        await db.expense_templates.insert_one(dict(t))
+        past = await recurring.past(db, t, today="2026-03-09")
+        future = await recurring.past(db, template(id="rent", start="2026-04"), today="2026-03-09")
+        return past, future
+
+    past, future = run(go())
+    assert [r["date"] for r in past] == ["2026-01-10", "2026-02-10"]
+    assert future == []
+
+
+@pytest.mark.parametrize("start,end", [
+    ("2026-01", "2026-1"),
+    ("2026-13", "2026-12"),
+    ("", "2026-01"),
+    ("2026-01", "9999-99"),
+])
+def test_month_range_rejects_malformed_bounds(start, end):
+    with pytest.raises(ValueError):
+        month_range(start, end)
+
+
+def test_month_range_crosses_years():
+    assert month_range("2025-11", "2026-02") == ["2025-11", "2025-12", "2026-01", "2026-02"]
+    assert month_range("2026-02", "2026-01") == []
+    assert month_range("9999-11", "9999-12") == ["9999-11", "9999-12"]
+
+
+@pytest.mark.parametrize("start,end", [
+    ("2026-01-01", "x"),
+    ("2026-01-01", "2026-1-5"),
+    ("2026-02-01", "2026-01-31"),
+    ("2026-01-01", "9999-12-31"),
+])
+def test_balance_range_is_checked_before_expansion(start, end):
+    with pytest.raises(ValueError):
+        balance.parse_range(start, end)
+
+
+def test_balance_range_within_limit():
+    lo, hi = balance.parse_range("2026-01-01", "2026-01-31")
+    assert (hi - lo).days == 30
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import sync
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def new_db():
+    return AsyncMongoMockClient()["sync_test"]
+
+
+async def insert(db, rid, seq):
+    await db.revenue.insert_one({"id": rid, "date": "2026-01-01", "seq": seq})
+
+
+def test_delta_after_token():
+    async def go():
+        db = new_db()
+        async with sync.reserve(db) as seq:
+            await insert(db, "a", seq)
+        first = await sync.changes(db, 0)
+
+        async with sync.reserve(db) as seq:
+            await insert(db, "b", seq)
+        delta = await sync.changes(db, first["token"])
+        return first, delta
+
+    first, delta = run(go())
+    assert first["reset"] and [r["id"] for r in first["revenue"]] == ["a"]
+    assert not delta["reset"] and [r["id"] for r in delta["revenue"]] == ["b"]
+
+
+def test_sync_during_write_does_not_skip_the_row():
+    async def go():
+        db = new_db()
+        async with sync.reserve(db) as seq:
+            await insert(db, "a", seq)
+        base = await sync.changes(db, 0)
+
+        reserved = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_writer():
+            async with sync.reserve(db) as seq:
+                reserved.set()
+                await release.wait()
+                await insert(db, "b", seq)
+
+        writer = asyncio.create_task(slow_writer())
+        await reserved.wait()
+        # the sequence is taken but the row is not written yet
+        mid = await sync.changes(db, base["token"])
+        release.set()
+        await writer
+
+        after = await sync.changes(db, mid["token"])
+        return base, mid, after
+
+    base, mid, after = run(go())
+    assert mid["revenue"] == []
+    assert mid["token"] == base["token"]
+    assert [r["id"] for r in after["revenue"]] == ["b"]
+
+
+def test_stale_marker_is_ignored():
+    async def go():
+        db = new_db()
+        async with sync.reserve(db) as seq:
+            await insert(db, "a", seq)
+        await db.sync_pending.insert_one({
+            "_id": "dead", "floor": 0,
+            "at": sync.datetime.now(sync.timezone.utc)
+            - sync.timedelta(seconds=sync.SYNC_PENDING_SECONDS + 1),
+        })
+        return await sync.changes(db, 0)
+
+    assert run(go())["token"] == 1
+
+
+def test_reset_is_paged_from_the_token_it_started_at(monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_MAX_CHANGES", 2)
+
+    async def go():
+        db = new_db()
+        for rid in "abcde":
+            async with sync.reserve(db) as seq:
+                await insert(db, rid, seq)
+
+        pages = [await sync.changes(db, 0)]
+        # written while the client is still paging
+        async with sync.reserve(db) as seq:
+            await insert(db, "f", seq)
+        while pages[-1]["next"]:
+            pages.append(await sync.changes(db, 0, cursor=pages[-1]["next"]))
+
+        delta = await sync.changes(db, pages[-1]["token"])
+        return pages, delta
+
+    pages, delta = run(go())
+    assert [p["reset"] for p in pages] == [True, False, False]
+    assert {p["token"] for p in pages} == {5}
+    # a row written mid-reset may come in a later page and again in the delta
+    assert [r["id"] for p in pages for r in p["revenue"]] == list("abcdef")
+    assert "f" in [r["id"] for r in delta["revenue"]]
+
+
+def test_bad_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        run(sync.changes(new_db(), 0, cursor="not-a-cursor"))